@@ -5,13 +5,18 @@ This agent generates human-like responses pretending to be a victim,
 maintaining a consistent persona throughout the conversation.
 """
 
+import asyncio
 import logging
 import random
-import time
-from typing import Dict, List, Optional
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 import google.generativeai as genai
 
+from .gemini_client import generate_content, get_model
+from .rate_limiter import GeminiLimiter, backoff_delay, estimate_tokens, is_retryable
 from .prompts import (
     PERSONA_PROMPTS,
     build_actor_prompt,
@@ -21,6 +26,98 @@ from .prompts import (
 
 logger = logging.getLogger(__name__)
 
+# Digits and links vary between copies of the same scam template
+_URL_PATTERN = re.compile(r'(?:https?://|www\.)\S+', re.IGNORECASE)
+_DIGIT_PATTERN = re.compile(r'\d+')
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Labels the model sometimes puts before its reply
+_REPLY_PREFIX_PATTERN = re.compile(r'(?:reply|response|message|answer):', re.IGNORECASE)
+
+# Replies used when Gemini is unavailable, per persona
+FALLBACK_RESPONSES = {
+    "elderly": (
+        "Oh my, I'm so confused. Can you explain again?",
+        "I don't understand. What should I do?",
+        "This is worrying me. Is this real?",
+        "I'm not sure what you mean. Can you help?",
+        "My son usually helps me with these things.",
+    ),
+    "professional": (
+        "I'll need verification for this.",
+        "Can you send official documentation?",
+        "I'm in a meeting. Send details via email.",
+        "Let me check with my bank first.",
+        "What's the official reference number?",
+    ),
+    "novice": (
+        "omg wait what is happening",
+        "im so confused rn",
+        "this is scary idk what to do",
+        "can u explain step by step?",
+        "pls help me understand this",
+    ),
+}
+
+# Opening replies when starting a conversation, per persona
+INITIAL_RESPONSES = {
+    "elderly": (
+        "Hello? Who is this?",
+        "Yes, I received a message. Is something wrong?",
+        "Oh dear, what's happening with my account?",
+    ),
+    "professional": (
+        "Yes, I saw your message. What's this about?",
+        "I'm busy. Can you be quick?",
+        "What seems to be the issue?",
+    ),
+    "novice": (
+        "hey i got ur msg, whats going on?",
+        "hi, is this about my account??",
+        "omg did something happen?",
+    ),
+}
+
+# Scam type routing keywords; dict order is priority order
+SCAM_TYPE_BUCKETS = {
+    "lottery": frozenset({"lottery", "winner", "prize"}),
+    "banking": frozenset({"bank", "account", "kyc"}),
+    "job": frozenset({"job", "work", "salary"}),
+    "delivery": frozenset({"delivery", "package", "order"}),
+    "otp": frozenset({"otp", "password", "pin"}),
+}
+_KEYWORD_TO_SCAM_TYPE = {
+    keyword: scam_type
+    for scam_type, keywords in SCAM_TYPE_BUCKETS.items()
+    for keyword in keywords
+}
+_SCAM_TYPE_PRIORITY = {scam_type: rank for rank, scam_type in enumerate(SCAM_TYPE_BUCKETS)}
+# Zero-width lookahead so overlapping keywords are all reported
+_SCAM_TYPE_PATTERN = re.compile(
+    "(?=(" + "|".join(re.escape(keyword) for keyword in _KEYWORD_TO_SCAM_TYPE) + "))"
+)
+
+
+@lru_cache(maxsize=1024)
+def _scam_types_for_indicator(indicator: str) -> FrozenSet[str]:
+    """
+    Get the scam types whose keywords occur in one detector indicator.
+    
+    Detectors emit a small vocabulary of indicators, so results are cached
+    and repeat indicators cost a single lookup. Keywords are matched as
+    substrings, so "banking" still routes to "banking".
+    
+    Args:
+        indicator: Indicator text as emitted by the detector
+        
+    Returns:
+        Matching scam types
+    """
+    return frozenset(
+        _KEYWORD_TO_SCAM_TYPE[keyword]
+        for keyword in _SCAM_TYPE_PATTERN.findall(indicator.lower())
+    )
+
 
 class ActorAgent:
     """
@@ -32,17 +129,27 @@ class ActorAgent:
     Attributes:
         api_key (str): Gemini API key
         model_name (str): Gemini model identifier
-        model: Gemini GenerativeModel instance
+        model: Gemini GenerativeModel instance (persona passed in the prompt)
+        persona_models: Per-persona models with the persona as system instruction
         current_persona (str): Currently active persona
+        cache_size (int): Maximum number of cached opening replies
     """
     
-    def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash"):
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = "gemini-1.5-flash",
+        cache_size: int = 10000,
+        limiter: Optional[GeminiLimiter] = None
+    ):
         """
         Initialize the actor agent.
         
         Args:
             api_key: Gemini API key
             model_name: Model to use (default: gemini-1.5-flash)
+            cache_size: Maximum cached replies (0 disables the cache)
+            limiter: Optional shared Gemini rate limiter
             
         Raises:
             ValueError: If api_key is empty
@@ -53,29 +160,57 @@ class ActorAgent:
         self.api_key = api_key
         self.model_name = model_name
         self.model = self._initialize_client()
+        self.persona_models = self._initialize_persona_models()
         self.current_persona = None
+        self._rng = random.Random()
+        self.limiter = limiter
         self.max_retries = 2
-        self.retry_delay = 1.0
+        self.retry_delay = 0.25  # Base delay, doubled on each retry
+        self.cache_size = cache_size
+        self._response_cache: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
         
         logger.info(f"ActorAgent initialized with model: {model_name}")
     
+    def _generation_settings(self) -> Dict[str, float]:
+        """Generation settings for creative responses."""
+        return {
+            "temperature": 0.8,  # Higher temperature for more varied responses
+            "max_output_tokens": 200,
+            "top_p": 0.9,
+        }
+    
     def _initialize_client(self) -> genai.GenerativeModel:
-        """Initialize Gemini API client."""
-        genai.configure(api_key=self.api_key)
+        """Get the shared Gemini model for response generation."""
+        return get_model(self.api_key, self.model_name, **self._generation_settings())
+    
+    def _initialize_persona_models(self) -> Dict[str, genai.GenerativeModel]:
+        """
+        Create one model per persona with the persona prompt as system instruction.
         
-        # Configure generation settings for creative responses
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.8,  # Higher temperature for more varied responses
-            max_output_tokens=200,
-            top_p=0.9,
-        )
+        Keeping the persona out of the per-turn prompt gives every request of a
+        persona an identical prefix, which Gemini can serve from its implicit
+        prompt cache instead of re-processing it each turn.
         
-        return genai.GenerativeModel(
-            model_name=self.model_name,
-            generation_config=generation_config,
-        )
+        Returns:
+            Dict mapping persona name to model, empty if the installed
+            google-generativeai version does not support system_instruction
+        """
+        models = {}
+        try:
+            for persona, persona_prompt in PERSONA_PROMPTS.items():
+                models[persona] = get_model(
+                    self.api_key,
+                    self.model_name,
+                    system_instruction=persona_prompt,
+                    **self._generation_settings(),
+                )
+        except TypeError:
+            # Fallback for older google-generativeai versions
+            logger.warning("system_instruction not supported by this version of google-generativeai. Using prompt prefix fallback.")
+            return {}
+        return models
     
-    def generate_response(
+    async def generate_response(
         self,
         message: str,
         persona: str,
@@ -84,6 +219,10 @@ class ActorAgent:
         """
         Generate a persona-based response to a scammer message.
         
+        Opening messages (no history) are served from a per-persona cache
+        keyed by the normalized message, since scam campaigns reuse the same
+        templates with only numbers and links changed.
+        
         Args:
             message: Latest scammer message
             persona: One of "elderly", "professional", "novice"
@@ -103,17 +242,37 @@ class ActorAgent:
         self.current_persona = persona
         logger.info(f"Generating response as '{persona}' persona")
         
+        cache_key = None
+        if not history and self.cache_size > 0:
+            cache_key = (persona, self._normalize_message(message))
+            cached = self._response_cache.get(cache_key)
+            if cached is not None:
+                self._response_cache.move_to_end(cache_key)
+                logger.info(f"Response cache hit for '{persona}' persona")
+                return humanize_response(cached, typo_probability=0.05)
+        
         for attempt in range(self.max_retries + 1):
             try:
-                # Build prompt with persona and context
-                prompt = build_actor_prompt(message, persona, history)
+                # Build prompt with context; the persona rides in the
+                # system instruction when a persona model is available
+                model = self.persona_models.get(persona)
+                prompt = build_actor_prompt(
+                    message, persona, history, include_persona=model is None
+                )
+                
+                if self.limiter is not None:
+                    max_tokens = self._generation_settings()["max_output_tokens"]
+                    await self.limiter.acquire(estimate_tokens(prompt, max_tokens))
                 
                 # Call Gemini API
-                response = self.model.generate_content(prompt)
+                response = await generate_content(model or self.model, prompt)
                 
                 # Clean and validate response
                 text = self._clean_response(response.text)
                 
+                if cache_key is not None and text:
+                    self._store_cached_response(cache_key, text)
+                
                 # Add human-like typos occasionally
                 text = humanize_response(text, typo_probability=0.05)
                 
@@ -122,13 +281,39 @@ class ActorAgent:
                 
             except Exception as e:
                 logger.error(f"Error generating response on attempt {attempt + 1}: {str(e)}")
+                if not is_retryable(e):
+                    break
                 if attempt < self.max_retries:
-                    time.sleep(self.retry_delay)
+                    await asyncio.sleep(backoff_delay(attempt, self.retry_delay))
                     continue
         
         logger.warning("All attempts failed, using fallback response")
         return self._get_fallback_response(persona)
     
+    def _normalize_message(self, message: str) -> str:
+        """
+        Normalize a message for cache lookup.
+        
+        Lowercases and strips links, digits and extra whitespace so that
+        copies of the same scam template share a cache entry.
+        
+        Args:
+            message: Raw scammer message
+            
+        Returns:
+            Normalized message text
+        """
+        text = _URL_PATTERN.sub(" ", message.lower())
+        text = _DIGIT_PATTERN.sub("", text)
+        return _WHITESPACE_PATTERN.sub(" ", text).strip()
+    
+    def _store_cached_response(self, key: Tuple[str, str], text: str) -> None:
+        """Store a cleaned response, evicting the oldest entry when full."""
+        self._response_cache[key] = text
+        self._response_cache.move_to_end(key)
+        while len(self._response_cache) > self.cache_size:
+            self._response_cache.popitem(last=False)
+    
     def _clean_response(self, response_text: str) -> str:
         """
         Clean up the generated response.
@@ -149,24 +334,15 @@ class ActorAgent:
             text = text[1:-1]
         
         # Remove any prefix like "Reply:" or "Response:"
-        prefixes = ["reply:", "response:", "message:", "answer:"]
-        text_lower = text.lower()
-        for prefix in prefixes:
-            if text_lower.startswith(prefix):
-                text = text[len(prefix):].strip()
-                break
+        prefix = _REPLY_PREFIX_PATTERN.match(text)
+        if prefix:
+            text = text[prefix.end():].strip()
         
         # Ensure reasonable length (max 200 characters)
         if len(text) > 200:
-            # Try to cut at a sentence boundary
-            sentences = text.split('.')
-            result = ""
-            for sentence in sentences:
-                if len(result) + len(sentence) + 1 <= 180:
-                    result += sentence + "."
-                else:
-                    break
-            text = result.strip() if result else text[:180] + "..."
+            # Cut at the last sentence boundary within 180 characters
+            cut = text.rfind('.', 0, 180)
+            text = text[:cut + 1].strip() if cut != -1 else text[:180] + "..."
         
         return text
     
@@ -180,32 +356,8 @@ class ActorAgent:
         Returns:
             Fallback response appropriate for the persona
         """
-        fallbacks = {
-            "elderly": [
-                "Oh my, I'm so confused. Can you explain again?",
-                "I don't understand. What should I do?",
-                "This is worrying me. Is this real?",
-                "I'm not sure what you mean. Can you help?",
-                "My son usually helps me with these things.",
-            ],
-            "professional": [
-                "I'll need verification for this.",
-                "Can you send official documentation?",
-                "I'm in a meeting. Send details via email.",
-                "Let me check with my bank first.",
-                "What's the official reference number?",
-            ],
-            "novice": [
-                "omg wait what is happening",
-                "im so confused rn",
-                "this is scary idk what to do",
-                "can u explain step by step?",
-                "pls help me understand this",
-            ],
-        }
-        
-        responses = fallbacks.get(persona, fallbacks["elderly"])
-        return random.choice(responses)
+        responses = FALLBACK_RESPONSES.get(persona) or FALLBACK_RESPONSES["elderly"]
+        return responses[self._rng.randrange(len(responses))]
     
     def select_persona(
         self,
@@ -224,22 +376,16 @@ class ActorAgent:
         Returns:
             Selected persona name
         """
-        # Determine scam type from indicators
+        # Determine scam type from indicators; when several types match,
+        # the earliest in SCAM_TYPE_BUCKETS wins
         scam_type = "general"
         
         if scam_indicators:
-            indicators_text = " ".join(scam_indicators).lower()
-            
-            if any(k in indicators_text for k in ["lottery", "winner", "prize"]):
-                scam_type = "lottery"
-            elif any(k in indicators_text for k in ["bank", "account", "kyc"]):
-                scam_type = "banking"
-            elif any(k in indicators_text for k in ["job", "work", "salary"]):
-                scam_type = "job"
-            elif any(k in indicators_text for k in ["delivery", "package", "order"]):
-                scam_type = "delivery"
-            elif any(k in indicators_text for k in ["otp", "password", "pin"]):
-                scam_type = "otp"
+            matched = frozenset().union(
+                *(_scam_types_for_indicator(indicator) for indicator in scam_indicators)
+            )
+            if matched:
+                scam_type = min(matched, key=_SCAM_TYPE_PRIORITY.__getitem__)
         
         persona = get_persona_for_scam_type(scam_type, channel)
         
@@ -256,23 +402,5 @@ class ActorAgent:
         Returns:
             Initial engagement response
         """
-        initials = {
-            "elderly": [
-                "Hello? Who is this?",
-                "Yes, I received a message. Is something wrong?",
-                "Oh dear, what's happening with my account?",
-            ],
-            "professional": [
-                "Yes, I saw your message. What's this about?",
-                "I'm busy. Can you be quick?",
-                "What seems to be the issue?",
-            ],
-            "novice": [
-                "hey i got ur msg, whats going on?",
-                "hi, is this about my account??",
-                "omg did something happen?",
-            ],
-        }
-        
-        responses = initials.get(persona, initials["elderly"])
-        return random.choice(responses)
+        responses = INITIAL_RESPONSES.get(persona) or INITIAL_RESPONSES["elderly"]
+        return responses[self._rng.randrange(len(responses))]
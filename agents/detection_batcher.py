@@ -0,0 +1,143 @@
+"""
+Micro-batching of scam detection requests.
+
+Under bursty load many sessions open at once, each needing a detector
+call. DetectionBatcher holds first-contact messages for a few milliseconds
+and classifies them together in one Gemini request, sharing the request
+overhead and system prompt across the batch.
+"""
+
+import asyncio
+import contextlib
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .detector_agent import DetectorAgent
+
+logger = logging.getLogger(__name__)
+
+
+class DetectionBatcher:
+    """
+    Coalesces concurrent detection requests into combined Gemini calls.
+
+    Only messages without history are batched, since each combined prompt
+    analyzes messages independently; others go straight to the detector.
+
+    Attributes:
+        detector: DetectorAgent used for the calls
+        max_batch: Flush as soon as this many messages are waiting
+        max_wait: Seconds to wait for more messages before flushing
+        semaphore: Optional limit on Gemini calls in flight; a whole batch
+            holds one slot
+    """
+
+    def __init__(
+        self,
+        detector: DetectorAgent,
+        max_batch: int = 16,
+        max_wait_ms: int = 20,
+        semaphore: Optional[asyncio.Semaphore] = None
+    ):
+        """
+        Initialize the batcher.
+
+        Args:
+            detector: DetectorAgent used for the calls
+            max_batch: Maximum messages per combined request
+            max_wait_ms: Milliseconds to wait for a batch to fill
+            semaphore: Optional limit on Gemini calls in flight
+        """
+        self.detector = detector
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.semaphore = semaphore
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        logger.info(f"DetectionBatcher initialized: max_batch={max_batch}, max_wait_ms={max_wait_ms}")
+
+    async def detect_scam(
+        self,
+        message: str,
+        history: Optional[List[Dict]] = None
+    ) -> Dict[str, Any]:
+        """
+        Detect if a message is a scam, batching with concurrent requests.
+
+        Args:
+            message: Message text to analyze
+            history: Optional conversation history for context
+
+        Returns:
+            Detection result, as from DetectorAgent.detect_scam
+        """
+        if history or self.max_batch <= 1 or not message or not message.strip():
+            async with self._slot():
+                return await self.detector.detect_scam(message, history)
+
+        local = await self.detector.get_local_result(message)
+        if local is not None:
+            return local
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((message, future))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+
+        return await future
+
+    def _slot(self):
+        """Hold one slot of the shared Gemini limit, if there is one."""
+        return self.semaphore if self.semaphore is not None else contextlib.nullcontext()
+
+    def _flush(self) -> None:
+        """Send all waiting messages as one batch."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # Callers that gave up while waiting do not need a verdict
+        batch = [(message, future) for message, future in self._pending if not future.cancelled()]
+        self._pending = []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run_batch(batch))
+            # Keep a reference so the task is not garbage collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """
+        Classify a batch and resolve each waiting caller.
+
+        Falls back to one detect_scam call per message if the combined
+        request fails or returns the wrong number of verdicts.
+        """
+        messages = [message for message, _ in batch]
+
+        if len(messages) == 1:
+            async with self._slot():
+                results = [await self.detector.detect_scam(messages[0], force=True)]
+        else:
+            try:
+                async with self._slot():
+                    results = await self.detector.detect_scam_combined(messages)
+            except Exception as e:
+                logger.warning(f"Combined detection of {len(messages)} messages failed: {e}")
+                results = await asyncio.gather(
+                    *(self._detect_one(message) for message in messages)
+                )
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def _detect_one(self, message: str) -> Dict[str, Any]:
+        """Classify one message of a failed batch in its own slot."""
+        async with self._slot():
+            return await self.detector.detect_scam(message, force=True)
@@ -5,18 +5,58 @@ This agent analyzes incoming messages and classifies them as scam or legitimate
 with a confidence score and reasoning.
 """
 
+import asyncio
 import json
 import logging
 import re
-import time
+from collections import OrderedDict
 from typing import Dict, List, Any, Optional
 
 import google.generativeai as genai
+import orjson
 
-from .prompts import DETECTOR_SYSTEM_PROMPT, build_detector_prompt
+from .gemini_client import generate_content, generate_json_text, get_model
+from .prompts import (
+    DETECTOR_SYSTEM_PROMPT,
+    build_detector_batch_prompt,
+    build_detector_prompt,
+    render_detector_history,
+)
+from .rate_limiter import GeminiLimiter, backoff_delay, estimate_tokens, is_retryable
+from .result_store import ResultStore, result_key
 
 logger = logging.getLogger(__name__)
 
+# High-confidence scam phrases used for quick screening
+STRONG_SCAM_INDICATORS = (
+    "send otp",
+    "share otp",
+    "your account will be",
+    "account suspended",
+    "account blocked",
+    "kyc update",
+    "click here to verify",
+    "won lottery",
+    "lucky winner",
+    "processing fee",
+    "claim your prize",
+    "legal action",
+    "police complaint",
+    "arrest warrant",
+)
+
+# Single-pass matcher over all indicators, compiled once at import
+_STRONG_INDICATOR_PATTERN = re.compile(
+    "|".join(re.escape(indicator) for indicator in STRONG_SCAM_INDICATORS)
+)
+
+# JSON body of a markdown code block in a Gemini reply
+_CODE_BLOCK_PATTERN = re.compile(r'```(?:json)?\s*([\s\S]*?)\s*```')
+
+# Output budgets for single-message and combined multi-message detection
+MAX_OUTPUT_TOKENS = 500
+BATCH_MAX_OUTPUT_TOKENS = 2048
+
 
 class DetectorAgent:
     """
@@ -29,15 +69,26 @@ class DetectorAgent:
         api_key (str): Gemini API key
         model_name (str): Gemini model identifier
         model: Gemini GenerativeModel instance
+        batch_model: Model with a larger output budget for combined requests
     """
     
-    def __init__(self, api_key: str, model_name: str = "gemini-1.5-flash"):
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str = "gemini-1.5-flash",
+        limiter: Optional[GeminiLimiter] = None,
+        result_store: Optional[ResultStore] = None,
+        cache_size: int = 10000
+    ):
         """
         Initialize the detector agent.
         
         Args:
             api_key: Gemini API key
             model_name: Model to use (default: gemini-1.5-flash)
+            limiter: Optional shared Gemini rate limiter
+            result_store: Optional persistent store for Gemini verdicts
+            cache_size: Maximum verdicts kept in memory (0 disables the cache)
             
         Raises:
             ValueError: If api_key is empty
@@ -47,53 +98,57 @@ class DetectorAgent:
         
         self.api_key = api_key
         self.model_name = model_name
-        self.model = self._initialize_client()
+        self.model = self._initialize_client(MAX_OUTPUT_TOKENS)
+        self.batch_model = self._initialize_client(BATCH_MAX_OUTPUT_TOKENS)
+        self.limiter = limiter
+        self.result_store = result_store
+        self.cache_size = cache_size
+        self._result_cache: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
         self.max_retries = 2
-        self.retry_delay = 1.0
+        self.retry_delay = 0.25  # Base delay, doubled on each retry
+        self.quick_detections = 0  # Detections answered without Gemini
         
         logger.info(f"DetectorAgent initialized with model: {model_name}")
     
-    def _initialize_client(self) -> genai.GenerativeModel:
-        """Initialize Gemini API client."""
-        genai.configure(api_key=self.api_key)
-        
-        # Configure generation settings
-        generation_config = genai.types.GenerationConfig(
-            temperature=0.3,  # Lower temperature for more consistent classification
-            max_output_tokens=500,
-        )
+    def _initialize_client(self, max_output_tokens: int) -> genai.GenerativeModel:
+        """Get the shared Gemini model for detection."""
+        # Lower temperature for more consistent classification
+        settings = {"temperature": 0.3, "max_output_tokens": max_output_tokens}
         
         try:
             # Try with system_instruction (modern way)
-            model = genai.GenerativeModel(
-                model_name=self.model_name,
-                generation_config=generation_config,
+            model = get_model(
+                self.api_key,
+                self.model_name,
                 system_instruction=DETECTOR_SYSTEM_PROMPT,
+                **settings,
             )
             self.uses_system_instruction = True
             return model
         except TypeError:
             # Fallback for older google-generativeai versions
             logger.warning("system_instruction not supported by this version of google-generativeai. Using prompt prefix fallback.")
-            model = genai.GenerativeModel(
-                model_name=self.model_name,
-                generation_config=generation_config,
-            )
+            model = get_model(self.api_key, self.model_name, **settings)
             self.uses_system_instruction = False
             return model
 
     
-    def detect_scam(
+    async def detect_scam(
         self, 
         message: str, 
-        history: Optional[List[Dict]] = None
+        history: Optional[List[Dict]] = None,
+        force: bool = False
     ) -> Dict[str, Any]:
         """
         Detect if a message is a scam.
         
+        Messages containing a strong scam indicator are classified locally
+        without calling Gemini, unless force is set.
+        
         Args:
             message: Message text to analyze
             history: Optional conversation history for context
+            force: Always run the Gemini analysis
             
         Returns:
             Dict containing:
@@ -106,23 +161,38 @@ class DetectorAgent:
             logger.warning("Empty message received")
             return self._default_response()
         
+        # Render the history once for both the cache key and the prompt
+        history_text = render_detector_history(history)
+        cache_key = self._result_key(message, history_text)
+        
+        if not force:
+            local = await self._local_result(message, cache_key)
+            if local is not None:
+                return local
+        
         logger.info(f"Analyzing message: {message[:50]}...")
         
+        # Build prompt with history context
+        prompt = build_detector_prompt(message, history_text=history_text)
+        
+        # If system_instruction was not supported, prepend it to the prompt
+        if not getattr(self, "uses_system_instruction", True):
+            prompt = f"{DETECTOR_SYSTEM_PROMPT}\n\n{prompt}"
+        
         for attempt in range(self.max_retries + 1):
             try:
-                # Build prompt with history context
-                prompt = build_detector_prompt(message, history)
+                if self.limiter is not None:
+                    await self.limiter.acquire(estimate_tokens(prompt, MAX_OUTPUT_TOKENS))
                 
-                # If system_instruction was not supported, prepend it to the prompt
-                if not getattr(self, "uses_system_instruction", True):
-                    prompt = f"{DETECTOR_SYSTEM_PROMPT}\n\n{prompt}"
-                
-                # Call Gemini API
-                response = self.model.generate_content(prompt)
-
+                # Call Gemini API, streaming until the JSON object closes
+                response_text = await generate_json_text(self.model, prompt)
                 
                 # Parse JSON response
-                result = self._parse_response(response.text)
+                result = self._parse_response(response_text)
+                
+                if cache_key is not None:
+                    self._remember(cache_key, result)
+                    await self._persist(cache_key, result)
                 
                 logger.info(
                     f"Scam detection complete: is_scam={result['is_scam']} "
@@ -133,18 +203,181 @@ class DetectorAgent:
             except json.JSONDecodeError as e:
                 logger.warning(f"JSON parse error on attempt {attempt + 1}: {e}")
                 if attempt < self.max_retries:
-                    time.sleep(self.retry_delay)
+                    await asyncio.sleep(backoff_delay(attempt, self.retry_delay))
                     continue
                     
             except Exception as e:
                 logger.error(f"Error detecting scam on attempt {attempt + 1}: {str(e)}")
+                if not is_retryable(e):
+                    break
                 if attempt < self.max_retries:
-                    time.sleep(self.retry_delay)
+                    await asyncio.sleep(backoff_delay(attempt, self.retry_delay))
                     continue
         
-        logger.error("All retry attempts failed, returning default response")
+        logger.error("Detection failed, returning default response")
         return self._default_response()
     
+    async def get_local_result(
+        self,
+        message: str,
+        history: Optional[List[Dict]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Get a detection result without calling Gemini, if one is available.
+        
+        Covers strong-indicator matches and earlier Gemini verdicts for the
+        same message and context, from memory or the result store. Scam
+        campaigns resend identical texts, so repeats are common.
+        
+        Args:
+            message: Message text to analyze
+            history: Optional conversation history for context
+            
+        Returns:
+            Detection result, or None if Gemini is needed
+        """
+        return await self._local_result(
+            message, self._result_key(message, render_detector_history(history))
+        )
+    
+    async def _local_result(self, message: str, cache_key: Optional[bytes]) -> Optional[Dict[str, Any]]:
+        """get_local_result with the verdict cache key already computed."""
+        indicator = self._match_strong_indicator(message)
+        if indicator:
+            self.quick_detections += 1
+            logger.info(f"Strong indicator '{indicator}' matched, skipping Gemini")
+            return {
+                "is_scam": True,
+                "confidence": 0.95,
+                "reason": f"Matched strong scam indicator: {indicator}",
+                "indicators": [indicator],
+            }
+        
+        if cache_key is None:
+            return None
+        
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            self._result_cache.move_to_end(cache_key)
+            logger.info("Detection result served from cache")
+            return cached
+        
+        if self.result_store is not None:
+            # The store lock is shared with background writes, so a stalled
+            # commit must not block the event loop
+            stored = await asyncio.to_thread(self.result_store.get, cache_key)
+            if stored is not None:
+                logger.info("Detection result served from store")
+                self._remember(cache_key, stored)
+                return stored
+        
+        return None
+    
+    def _remember(self, key: bytes, result: Dict[str, Any]) -> None:
+        """
+        Keep a Gemini verdict in memory for reuse, evicting the least recently used.
+        
+        Args:
+            key: Key from _result_key()
+            result: Detection result
+        """
+        if self.cache_size > 0:
+            self._result_cache[key] = result
+            self._result_cache.move_to_end(key)
+            if len(self._result_cache) > self.cache_size:
+                self._result_cache.popitem(last=False)
+    
+    async def _persist(self, key: bytes, result: Dict[str, Any]) -> None:
+        """
+        Write a Gemini verdict to the result store, if configured.
+        
+        The SQLite write and commit run in a worker thread so they do not
+        block the event loop.
+        
+        Args:
+            key: Key from _result_key()
+            result: Detection result
+        """
+        if self.result_store is not None:
+            await asyncio.to_thread(self.result_store.put, key, result)
+    
+    def _result_key(self, message: str, history_text: str = "") -> Optional[bytes]:
+        """
+        Build the verdict cache key for a message, or None if nothing is cached.
+        
+        Args:
+            message: Message text
+            history_text: Context block from render_detector_history
+        """
+        if self.cache_size <= 0 and self.result_store is None:
+            return None
+        
+        return result_key(message, (history_text,) if history_text else ())
+    
+    async def detect_scam_combined(self, messages: List[str]) -> List[Dict[str, Any]]:
+        """
+        Classify several independent messages with a single Gemini call.
+        
+        Used by DetectionBatcher to amortize request overhead and the system
+        prompt across concurrent sessions. Unlike detect_scam, this makes one
+        attempt and raises on failure so the caller can fall back.
+        
+        Args:
+            messages: Message texts to analyze (without history)
+            
+        Returns:
+            Detection results in the same order as messages
+            
+        Raises:
+            json.JSONDecodeError: If the response is not valid JSON
+            ValueError: If the response does not hold one verdict per message
+        """
+        prompt = build_detector_batch_prompt(messages)
+        if not getattr(self, "uses_system_instruction", True):
+            prompt = f"{DETECTOR_SYSTEM_PROMPT}\n\n{prompt}"
+        
+        if self.limiter is not None:
+            await self.limiter.acquire(estimate_tokens(prompt, BATCH_MAX_OUTPUT_TOKENS))
+        
+        logger.info(f"Analyzing {len(messages)} messages in one request")
+        response = await generate_content(self.batch_model, prompt)
+        results = self._parse_batch_response(response.text, len(messages))
+        
+        for message, result in zip(messages, results):
+            cache_key = self._result_key(message)
+            if cache_key is not None:
+                self._remember(cache_key, result)
+                await self._persist(cache_key, result)
+        
+        return results
+    
+    async def detect_scam_batch(
+        self,
+        messages: List[str],
+        max_concurrency: int = 8
+    ) -> List[Dict[str, Any]]:
+        """
+        Detect scams across many messages, e.g. when replaying logged corpora.
+        
+        Requests are issued concurrently, bounded by max_concurrency so bulk
+        runs stay within Gemini rate limits.
+        
+        Args:
+            messages: Message texts to analyze
+            max_concurrency: Maximum in-flight Gemini requests
+            
+        Returns:
+            Detection results in the same order as messages
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def detect_one(message: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.detect_scam(message)
+        
+        logger.info(f"Running batch detection on {len(messages)} messages")
+        return list(await asyncio.gather(*(detect_one(m) for m in messages)))
+    
     def _parse_response(self, response_text: str) -> Dict[str, Any]:
         """
         Safely parse JSON from Gemini response.
@@ -160,19 +393,51 @@ class DetectorAgent:
         Raises:
             json.JSONDecodeError: If parsing fails
         """
+        # orjson.JSONDecodeError subclasses json.JSONDecodeError
+        data = orjson.loads(self._strip_code_block(response_text))
+        return self._normalize_result(data)
+    
+    def _parse_batch_response(self, response_text: str, count: int) -> List[Dict[str, Any]]:
+        """
+        Parse a JSON array of verdicts from a combined Gemini response.
+        
+        Args:
+            response_text: Raw response text from Gemini
+            count: Number of messages that were analyzed
+            
+        Returns:
+            Parsed response dicts, one per message
+            
+        Raises:
+            json.JSONDecodeError: If parsing fails
+            ValueError: If the array does not hold count verdicts
+        """
+        data = orjson.loads(self._strip_code_block(response_text))
+        if not isinstance(data, list) or len(data) != count:
+            raise ValueError(f"Expected {count} verdicts in combined response")
+        
+        return [self._normalize_result(item) for item in data]
+    
+    def _strip_code_block(self, response_text: str) -> str:
+        """Return the JSON text, without any markdown code block around it."""
         text = response_text.strip()
         
         # Remove markdown code blocks if present
         if text.startswith("```"):
             # Find the JSON content between code blocks
-            match = re.search(r'```(?:json)?\s*([\s\S]*?)\s*```', text)
+            match = _CODE_BLOCK_PATTERN.search(text)
             if match:
                 text = match.group(1)
+            else:
+                # Streaming stops before the closing fence arrives
+                start = text.find("{")
+                if start != -1:
+                    text = text[start:]
         
-        # Parse JSON
-        data = json.loads(text)
-        
-        # Validate and normalize response
+        return text
+    
+    def _normalize_result(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate and normalize one parsed verdict."""
         return {
             "is_scam": bool(data.get("is_scam", False)),
             "confidence": float(data.get("confidence", 0.5)),
@@ -193,11 +458,17 @@ class DetectorAgent:
             "indicators": ["detection_fallback"],
         }
     
+    def close(self) -> None:
+        """Close the result store, if configured."""
+        if self.result_store is not None:
+            self.result_store.close()
+    
     def get_quick_classification(self, message: str) -> bool:
         """
         Quick classification without full analysis.
         
-        Uses basic keyword matching for fast initial screening.
+        Uses a precompiled multi-phrase pattern that scans the message
+        once, regardless of how many indicators are configured.
         
         Args:
             message: Message to classify
@@ -205,31 +476,20 @@ class DetectorAgent:
         Returns:
             True if message appears to be a scam
         """
+        return self._match_strong_indicator(message) is not None
+    
+    def _match_strong_indicator(self, message: str) -> Optional[str]:
+        """
+        Find the first strong scam indicator in a message.
+        
+        Args:
+            message: Message to scan
+            
+        Returns:
+            The matched indicator phrase, or None
+        """
         if not message:
-            return False
-        
-        message_lower = message.lower()
-        
-        # High-confidence scam indicators
-        strong_indicators = [
-            "send otp",
-            "share otp",
-            "your account will be",
-            "account suspended",
-            "account blocked",
-            "kyc update",
-            "click here to verify",
-            "won lottery",
-            "lucky winner",
-            "processing fee",
-            "claim your prize",
-            "legal action",
-            "police complaint",
-            "arrest warrant",
-        ]
-        
-        for indicator in strong_indicators:
-            if indicator in message_lower:
-                return True
-        
-        return False
+            return None
+        
+        match = _STRONG_INDICATOR_PATTERN.search(message.lower())
+        return match.group(0) if match else None
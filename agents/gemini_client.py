@@ -0,0 +1,189 @@
+"""
+Shared Gemini client helpers for the Honeypot agents.
+
+Configures the google-generativeai SDK once per process and hands out
+cached GenerativeModel instances, so every agent reuses the same model
+objects (and their underlying connections) instead of building its own.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from typing import Optional
+
+import google.generativeai as genai
+
+logger = logging.getLogger(__name__)
+
+# genai.configure mutates global SDK state; guard it against concurrent setup
+_configure_lock = threading.Lock()
+_configured_api_key: Optional[str] = None
+
+
+def configure(api_key: str) -> None:
+    """
+    Configure the Gemini SDK with an API key, once per distinct key.
+
+    Args:
+        api_key: Gemini API key
+    """
+    global _configured_api_key
+
+    with _configure_lock:
+        if _configured_api_key != api_key:
+            genai.configure(api_key=api_key)
+            _configured_api_key = api_key
+
+
+@functools.lru_cache(maxsize=8)
+def get_model(
+    api_key: str,
+    model_name: str,
+    temperature: float,
+    max_output_tokens: int,
+    top_p: Optional[float] = None,
+    system_instruction: Optional[str] = None
+) -> genai.GenerativeModel:
+    """
+    Get a shared GenerativeModel for the given settings.
+
+    Models are cached per argument combination, so agents created with the
+    same configuration share one instance.
+
+    Args:
+        api_key: Gemini API key
+        model_name: Gemini model identifier
+        temperature: Sampling temperature
+        max_output_tokens: Maximum tokens to generate
+        top_p: Optional nucleus sampling threshold
+        system_instruction: Optional system instruction
+
+    Returns:
+        Configured GenerativeModel instance
+
+    Raises:
+        TypeError: If system_instruction is not supported by the installed
+            google-generativeai version
+    """
+    configure(api_key)
+
+    config_kwargs = {"temperature": temperature, "max_output_tokens": max_output_tokens}
+    if top_p is not None:
+        config_kwargs["top_p"] = top_p
+
+    model_kwargs = {
+        "model_name": model_name,
+        "generation_config": genai.types.GenerationConfig(**config_kwargs),
+    }
+    if system_instruction is not None:
+        model_kwargs["system_instruction"] = system_instruction
+
+    logger.debug(f"Creating shared Gemini model: {model_name}")
+    return genai.GenerativeModel(**model_kwargs)
+
+
+async def generate_content(model: genai.GenerativeModel, prompt: str):
+    """
+    Call Gemini without blocking the event loop.
+
+    Uses the SDK's native coroutine when available and falls back to
+    running the blocking call in the default executor on older versions.
+
+    Args:
+        model: Model to send the prompt to
+        prompt: Complete prompt string
+
+    Returns:
+        Gemini response object
+    """
+    if hasattr(model, "generate_content_async"):
+        return await model.generate_content_async(prompt)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, model.generate_content, prompt)
+
+
+class _JsonObjectScanner:
+    """
+    Find where the first top-level JSON object in streamed text closes.
+
+    Braces inside string literals are ignored. The scan state is kept
+    between calls, so each chunk is read once no matter how many arrive.
+    """
+
+    def __init__(self) -> None:
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.offset = 0
+
+    def feed(self, chunk: str) -> int:
+        """
+        Scan the next chunk of text.
+
+        Args:
+            chunk: Text following everything fed so far
+
+        Returns:
+            Index into the whole text just past the closing brace, or -1 if
+            the object is still incomplete
+        """
+        for i, char in enumerate(chunk):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = self.depth > 0
+            elif char == "{":
+                self.depth += 1
+            elif char == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    return self.offset + i + 1
+
+        self.offset += len(chunk)
+        return -1
+
+
+async def generate_json_text(model: genai.GenerativeModel, prompt: str) -> str:
+    """
+    Stream a Gemini reply and stop as soon as its JSON object is complete.
+
+    Anything the model would emit after the closing brace (a trailing code
+    fence or commentary) is not waited for. Falls back to a regular call
+    when streaming is unavailable.
+
+    Args:
+        model: Model to send the prompt to
+        prompt: Complete prompt string
+
+    Returns:
+        Response text up to the end of the first JSON object, or the full
+        text when no complete object was produced
+    """
+    if not hasattr(model, "generate_content_async"):
+        response = await generate_content(model, prompt)
+        return response.text
+
+    response = await model.generate_content_async(prompt, stream=True)
+
+    parts = []
+    scanner = _JsonObjectScanner()
+    try:
+        async for chunk in response:
+            parts.append(chunk.text)
+            end = scanner.feed(chunk.text)
+            if end != -1:
+                return "".join(parts)[:end]
+    finally:
+        # Stopping early leaves the stream open; release its connection
+        aclose = getattr(response, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+    return "".join(parts)
@@ -6,12 +6,43 @@ such as bank accounts, UPI IDs, phone numbers, and phishing links.
 """
 
 import logging
-from typing import Dict, List
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from intelligence.extractors import IntelligenceExtractor
+from intelligence.extractors import IntelligenceExtractor, extractor as shared_extractor
 
 logger = logging.getLogger(__name__)
 
+# Intelligence categories, in response order
+INTEL_KEYS = ("bankAccounts", "upiIds", "phoneNumbers", "phishingLinks", "suspiciousKeywords")
+
+# Categories that identify the scammer directly (everything but keywords)
+HIGH_VALUE_KEYS = frozenset({"bankAccounts", "upiIds", "phoneNumbers", "phishingLinks"})
+
+# Below this many texts, process startup and pickling cost more than they save
+PARALLEL_EXTRACTION_THRESHOLD = 32
+
+# Worker pool for bulk extraction, created on first use
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Get the shared extraction process pool, creating it if needed."""
+    global _pool
+    
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+        return _pool
+
+
+def _extract_in_worker(text: str) -> Dict[str, List[str]]:
+    """Extract intelligence in a pool worker with its own shared extractor."""
+    return shared_extractor.extract_all(text)
+
 
 class InvestigatorAgent:
     """
@@ -24,9 +55,15 @@ class InvestigatorAgent:
         extractor: IntelligenceExtractor instance
     """
     
-    def __init__(self):
-        """Initialize the investigator agent with an extractor."""
-        self.extractor = IntelligenceExtractor()
+    def __init__(self, extractor: Optional[IntelligenceExtractor] = None):
+        """
+        Initialize the investigator agent with an extractor.
+        
+        Args:
+            extractor: Extractor to use (default: the shared module-level
+                instance, whose patterns are compiled once per process)
+        """
+        self.extractor = extractor or shared_extractor
         logger.info("InvestigatorAgent initialized")
     
     def extract_all(self, text: str) -> Dict[str, List[str]]:
@@ -48,7 +85,8 @@ class InvestigatorAgent:
             logger.warning("Empty text provided for extraction")
             return self._empty_result()
         
-        logger.debug(f"Extracting intelligence from text: {text[:100]}...")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Extracting intelligence from text: {text[:100]}...")
         
         result = self.extractor.extract_all(text)
         
@@ -69,18 +107,71 @@ class InvestigatorAgent:
         Returns:
             Aggregated intelligence from all messages
         """
-        aggregated = self._empty_result()
+        return self.extract_from_messages(
+            (message.get("sender", ""), message.get("text", "")) for message in history
+        )
+    
+    def extract_from_messages(
+        self,
+        messages: Iterable[Tuple[str, str]]
+    ) -> Dict[str, List[str]]:
+        """
+        Extract intelligence from (sender, text) pairs.
+        
+        Each message is extracted on its own through the extractor's result
+        cache, so on turn N of a conversation the N-1 earlier messages are
+        cache hits and only the new one is scanned.
         
-        for message in history:
-            text = message.get("text", "")
-            sender = message.get("sender", "")
+        Args:
+            messages: (sender, text) pairs; agent messages are skipped
             
-            # Only analyze scammer messages (not agent responses)
-            if sender != "agent" and text:
-                extracted = self.extract_all(text)
-                aggregated = self.merge_intelligence(aggregated, extracted)
+        Returns:
+            Aggregated intelligence from all scammer messages, without duplicates
+        """
+        # Insertion-ordered dicts as sets keep first-seen order across messages
+        merged: Dict[str, Dict[str, None]] = {key: {} for key in INTEL_KEYS}
+        
+        # Only analyze scammer messages (not agent responses)
+        for sender, text in messages:
+            if sender == "agent" or not text:
+                continue
+            extracted = self.extractor.extract_all(text)
+            for key in INTEL_KEYS:
+                items = extracted.get(key)
+                if items:
+                    merged[key].update(dict.fromkeys(items))
+        
+        result = {key: list(items) for key, items in merged.items()}
+        
+        total = self.get_total_count(result)
+        if total > 0:
+            logger.info(f"Extracted {total} intelligence items: {self._summarize(result)}")
+        
+        return result
+    
+    def extract_many(self, texts: List[str]) -> List[Dict[str, List[str]]]:
+        """
+        Extract intelligence from many independent texts, e.g. corpus replays.
+        
+        Large batches are spread across a process pool, since extraction is
+        CPU-bound and threads would serialize on the GIL. Each worker uses
+        its own module-level extractor, so patterns are compiled once per
+        process. Small batches run in-process.
+        
+        Args:
+            texts: Message texts to analyze
+            
+        Returns:
+            Extracted intelligence for each text, in input order
+        """
+        if len(texts) <= PARALLEL_EXTRACTION_THRESHOLD:
+            return [self.extractor.extract_all(text) for text in texts]
+        
+        workers = os.cpu_count() or 1
+        chunksize = max(1, len(texts) // (4 * workers))
         
-        return aggregated
+        logger.info(f"Extracting intelligence from {len(texts)} texts across {workers} workers")
+        return list(_get_pool().map(_extract_in_worker, texts, chunksize=chunksize))
     
     def merge_intelligence(
         self, 
@@ -95,14 +186,14 @@ class InvestigatorAgent:
             new: New intelligence to merge
             
         Returns:
-            Merged intelligence dict
+            Merged intelligence dict, existing items first, in first-seen order
         """
+        # Insertion-ordered dicts as sets: linear time and deterministic order
         result = {}
         
-        for key in ["bankAccounts", "upiIds", "phoneNumbers", "phishingLinks", "suspiciousKeywords"]:
-            existing_items = set(existing.get(key, []))
-            new_items = set(new.get(key, []))
-            merged = existing_items.union(new_items)
+        for key in INTEL_KEYS:
+            merged = dict.fromkeys(existing.get(key, ()))
+            merged.update(dict.fromkeys(new.get(key, ())))
             result[key] = list(merged)
         
         return result
@@ -143,8 +234,7 @@ class InvestigatorAgent:
         Returns:
             Count of high-value items
         """
-        high_value_keys = ["bankAccounts", "upiIds", "phoneNumbers", "phishingLinks"]
-        return sum(len(intelligence.get(k, [])) for k in high_value_keys)
+        return sum(len(intelligence.get(k, [])) for k in HIGH_VALUE_KEYS)
     
     def _empty_result(self) -> Dict[str, List[str]]:
         """Return an empty result structure."""
@@ -183,8 +273,14 @@ class InvestigatorAgent:
         Returns:
             Threat level: "low", "medium", "high", or "critical"
         """
-        high_value = self.get_high_value_count(intelligence)
-        types = self.get_types_count(intelligence)
+        # Count types and high-value items in one pass
+        high_value = types = 0
+        for key, items in intelligence.items():
+            count = len(items)
+            if count:
+                types += 1
+                if key in HIGH_VALUE_KEYS:
+                    high_value += count
         
         if high_value >= 3 or types >= 4:
             return "critical"
@@ -8,18 +8,39 @@ This is the central coordinator that manages the flow between:
 - SessionManager: State tracking
 """
 
+import asyncio
 import logging
 import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Any, Dict, List, Mapping, Optional
 
 from .detector_agent import DetectorAgent
+from .detection_batcher import DetectionBatcher
 from .actor_agent import ActorAgent
 from .investigator_agent import InvestigatorAgent
 from .session_manager import SessionManager
+from .rate_limiter import create_limiter
+from .result_store import ResultStore
 
 logger = logging.getLogger(__name__)
 
+# Fields of a "not engaged" response that are the same for every non-scam
+# turn; per-turn values are filled in on a copy
+_NOT_ENGAGED_RESPONSE: Dict[str, Any] = {
+    "status": "success",
+    "scamDetected": False,
+    "agentResponse": "",
+    "continueConversation": True,
+    "agentNotes": "",
+}
+# Agent note prefixes, joined with ". " into agentNotes
+_DETECTION_NOTE = "Detection: "
+_PERSONA_NOTE = "Persona: "
+_ENDED_NOTE = "Ended: "
+_NOTE_SEPARATOR = ". "
+
+_INTELLIGENCE_FIELDS = ("bankAccounts", "upiIds", "phishingLinks", "phoneNumbers", "suspiciousKeywords")
+
 
 class Orchestrator:
     """
@@ -34,6 +55,9 @@ class Orchestrator:
         investigator: InvestigatorAgent instance
         session_manager: SessionManager instance
         scam_confidence_threshold: Minimum confidence to treat as scam
+        max_concurrent_llm: Maximum Gemini calls in flight across sessions
+        detection_batcher: Optional batcher that combines concurrent detections
+        speculative_response: Start the first reply while detection is pending
     """
     
     def __init__(
@@ -42,7 +66,10 @@ class Orchestrator:
         actor: ActorAgent,
         investigator: InvestigatorAgent,
         session_manager: SessionManager,
-        scam_confidence_threshold: float = 0.7
+        scam_confidence_threshold: float = 0.7,
+        max_concurrent_llm: int = 32,
+        detection_batcher: Optional[DetectionBatcher] = None,
+        speculative_response: bool = False
     ):
         """
         Initialize the orchestrator with all agents.
@@ -53,16 +80,28 @@ class Orchestrator:
             investigator: InvestigatorAgent instance
             session_manager: SessionManager instance
             scam_confidence_threshold: Minimum confidence to engage as victim
+            max_concurrent_llm: Maximum Gemini calls in flight across sessions
+            detection_batcher: Optional batcher wrapping the detector, used to
+                combine concurrent first-contact detections into one call
+            speculative_response: Generate the first-turn reply in parallel
+                with detection, discarding it if the message is not a scam
         """
         self.detector = detector
+        self.detection_batcher = detection_batcher
         self.actor = actor
         self.investigator = investigator
         self.session_manager = session_manager
         self.scam_confidence_threshold = scam_confidence_threshold
+        self.max_concurrent_llm = max_concurrent_llm
+        self.speculative_response = speculative_response
+        self._llm_semaphore = asyncio.Semaphore(max(1, max_concurrent_llm))
+        if detection_batcher is not None:
+            # The batcher takes one slot per combined call, not one per waiter
+            detection_batcher.semaphore = self._llm_semaphore
         
         logger.info("Orchestrator initialized with all agents")
     
-    def process_message(
+    async def process_message(
         self,
         session_id: str,
         message: Dict[str, Any],
@@ -72,7 +111,9 @@ class Orchestrator:
         """
         Process an incoming message through the agent pipeline.
         
-        This is the main entry point for analyzing scam messages.
+        This is the main entry point for analyzing scam messages. Gemini
+        calls are awaited, so many sessions can be in flight concurrently
+        on a single event loop; turns of the same session are serialized.
         
         Args:
             session_id: Unique session identifier
@@ -83,7 +124,91 @@ class Orchestrator:
         Returns:
             Response dict matching GUVI API specification
         """
-        start_time = time.time()
+        # Turns of one session run in order under its own lock; other
+        # sessions are never blocked by it
+        async with self.session_manager.lock_for(session_id):
+            return await self._process_message(session_id, message, history, metadata)
+    
+    async def run_batch(self, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process many messages concurrently, e.g. for offline replay or evaluation.
+        
+        Keeps up to max_concurrent_llm messages in flight and starts a new one
+        as soon as any finishes, rather than waiting for a whole wave, so a
+        single slow Gemini call never idles the other slots.
+        
+        Args:
+            messages: Dicts with "session_id" and "message", and optional
+                "history" and "metadata"
+            
+        Returns:
+            Response dicts in input order
+            
+        Raises:
+            Exception: The first error raised by any message; messages still
+                in flight are cancelled
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(messages)
+        pending = iter(enumerate(messages))
+        inflight: Dict[asyncio.Task, int] = {}
+        target = max(1, self.max_concurrent_llm)
+        
+        def refill() -> None:
+            for index, item in pending:
+                task = asyncio.create_task(self.process_message(
+                    item["session_id"],
+                    item["message"],
+                    item.get("history") or [],
+                    item.get("metadata") or {}
+                ))
+                inflight[task] = index
+                if len(inflight) >= target:
+                    return
+        
+        refill()
+        try:
+            while inflight:
+                done, _ = await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    results[inflight.pop(task)] = task.result()
+                refill()
+        finally:
+            for task in inflight:
+                task.cancel()
+        
+        return results
+    
+    def process_message_sync(
+        self,
+        session_id: str,
+        message: Dict[str, Any],
+        history: List[Dict[str, Any]],
+        metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Blocking wrapper around process_message for callers without an event loop.
+        
+        Args:
+            session_id: Unique session identifier
+            message: Message dict with sender, text, timestamp
+            history: Previous conversation messages
+            metadata: Channel, language, locale info
+            
+        Returns:
+            Response dict matching GUVI API specification
+        """
+        return asyncio.run(self.process_message(session_id, message, history, metadata))
+    
+    async def _process_message(
+        self,
+        session_id: str,
+        message: Dict[str, Any],
+        history: List[Dict[str, Any]],
+        metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Run the agent pipeline for one message; see process_message."""
+        # Monotonic integer clock: immune to wall-clock jumps, no float math
+        start_ns = time.perf_counter_ns()
         
         # Extract message text
         message_text = message.get("text", "")
@@ -91,50 +216,95 @@ class Orchestrator:
         
         logger.info(f"Processing message for session {session_id}: {message_text[:50]}...")
         
-        # Get or create session
+        # Get or create session (a live read-only view of its state)
         session = self.session_manager.get_or_create_session(session_id)
         is_first_turn = session["turn_count"] == 0
         
         # Increment turn count
         turn_count = self.session_manager.increment_turn(session_id)
         
-        # Step 1: Detect scam (on first message or if not yet confirmed)
+        # Cached verdicts are known without a model call; a non-scam one
+        # answers the turn without extraction or a reply
+        needs_detection = is_first_turn or not session["scam_detected"]
         detection_result = None
-        if is_first_turn or not session["scam_detected"]:
-            detection_result = self.detector.detect_scam(message_text, history)
-            
-            self.session_manager.update_session(
-                session_id,
-                scam_detected=detection_result["is_scam"],
-                scam_confidence=detection_result["confidence"]
+        if needs_detection:
+            detection_result = await self.detector.get_local_result(message_text, history)
+            if detection_result is not None and self._is_confident_non_scam(detection_result):
+                return self._not_engaged_response(session_id, turn_count, detection_result, start_ns)
+        
+        # Steps 1 and 2 are independent: detect the scam (on first message or
+        # if not yet confirmed) while extracting intelligence in a worker
+        # thread, so the turn costs the slower of the two rather than the sum
+        extraction = asyncio.to_thread(self.investigator.extract_all, message_text)
+        
+        # On first contact, speculatively start the reply alongside detection
+        # so a confirmed scam costs max(detect, reply) instead of the sum.
+        # The persona is guessed from the message text and the reply is only
+        # kept if the detector's indicators lead to the same persona.
+        speculative_persona = None
+        speculative_reply = None
+        if (needs_detection and detection_result is None and self.speculative_response
+                and not session["persona_used"]):
+            speculative_persona = self.actor.select_persona(
+                scam_indicators=[message_text],
+                channel=metadata.get("channel", "sms"),
+                metadata=metadata
+            )
+            speculative_reply = asyncio.create_task(
+                self._generate_response(message_text, speculative_persona, history)
             )
         
-        # Refresh session state
-        session = self.session_manager.get_or_create_session(session_id)
+        async def detect() -> Dict[str, Any]:
+            result = await self._detect(message_text, history)
+            # A negative verdict never uses the reply; stop paying for it now
+            # rather than after extraction finishes
+            if speculative_reply is not None and not result["is_scam"]:
+                speculative_reply.cancel()
+            return result
         
-        # Step 2: Extract intelligence from scammer's message
-        intel = self.investigator.extract_all(message_text)
-        new_intel_added = self.session_manager.update_intelligence(session_id, intel)
-        
-        # Step 3: Generate response if scam detected
-        agent_response = ""
-        if session["scam_detected"] and session["scam_confidence"] >= self.scam_confidence_threshold:
-            # Select or maintain persona
-            persona = session["persona_used"]
-            if not persona:
-                persona = self.actor.select_persona(
-                    scam_indicators=detection_result.get("indicators", []) if detection_result else [],
-                    channel=metadata.get("channel", "sms"),
-                    metadata=metadata
+        try:
+            if needs_detection and detection_result is None:
+                detection_result, intel = await asyncio.gather(detect(), extraction)
+            else:
+                intel = await extraction
+            
+            if needs_detection:
+                # Confident non-scam traffic gets the minimal response; its
+                # extraction results are not recorded
+                if self._is_confident_non_scam(detection_result):
+                    return self._not_engaged_response(session_id, turn_count, detection_result, start_ns)
+                
+                self.session_manager.update_session(
+                    session_id,
+                    scam_detected=detection_result["is_scam"],
+                    scam_confidence=detection_result["confidence"]
                 )
-                self.session_manager.update_session(session_id, persona_used=persona)
             
-            # Generate response
-            agent_response = self.actor.generate_response(
-                message=message_text,
-                persona=persona,
-                history=history
-            )
+            new_intel_added = self.session_manager.update_intelligence(session_id, intel)
+            
+            # Step 3: Generate response if scam detected
+            agent_response = ""
+            if session["scam_detected"] and session["scam_confidence"] >= self.scam_confidence_threshold:
+                # Select or maintain persona
+                persona = session["persona_used"]
+                if not persona:
+                    persona = self.actor.select_persona(
+                        scam_indicators=detection_result.get("indicators", []) if detection_result else [],
+                        channel=metadata.get("channel", "sms"),
+                        metadata=metadata
+                    )
+                    self.session_manager.update_session(session_id, persona_used=persona)
+                
+                # Generate response, reusing the speculative reply if it fits
+                if speculative_reply is not None and persona == speculative_persona:
+                    agent_response = await speculative_reply
+                    speculative_reply = None
+                else:
+                    agent_response = await self._generate_response(message_text, persona, history)
+        finally:
+            # Not a scam, a different persona, or an error: drop the speculation
+            if speculative_reply is not None:
+                speculative_reply.cancel()
         
         # Step 4: Check if conversation should end
         should_end, end_reason = self.session_manager.should_end_conversation(session_id)
@@ -142,11 +312,10 @@ class Orchestrator:
         if should_end:
             self.session_manager.end_session(session_id, end_reason)
         
-        # Get final session state
-        session = self.session_manager.get_or_create_session(session_id)
-        
         # Calculate response time
-        response_time_ms = int((time.time() - start_time) * 1000)
+        elapsed_ns = time.perf_counter_ns() - start_ns
+        response_time_ms = elapsed_ns // 1_000_000
+        self.session_manager.add_processing_time(session_id, elapsed_ns)
         
         # Build response
         response = self._build_response(
@@ -169,10 +338,92 @@ class Orchestrator:
         
         return response
     
+    def _is_confident_non_scam(self, detection_result: Dict[str, Any]) -> bool:
+        """Whether a verdict clears the threshold needed to disengage."""
+        return (not detection_result["is_scam"]
+                and detection_result["confidence"] >= self.scam_confidence_threshold)
+    
+    def _not_engaged_response(
+        self,
+        session_id: str,
+        turn_count: int,
+        detection_result: Dict[str, Any],
+        start_ns: int
+    ) -> Dict[str, Any]:
+        """
+        Finish a turn judged not to be a scam without engaging.
+        
+        Skips intelligence merging, persona selection and reply generation,
+        and fills a copy of the shared response template.
+        
+        Args:
+            session_id: Session identifier
+            turn_count: Current turn number
+            detection_result: Negative detection result
+            start_ns: perf_counter_ns() value at the start of the turn
+            
+        Returns:
+            GUVI-compliant response dict
+        """
+        self.session_manager.update_session(
+            session_id,
+            scam_detected=False,
+            scam_confidence=detection_result["confidence"]
+        )
+        
+        should_end, end_reason = self.session_manager.should_end_conversation(session_id)
+        if should_end:
+            self.session_manager.end_session(session_id, end_reason)
+        
+        elapsed_ns = time.perf_counter_ns() - start_ns
+        self.session_manager.add_processing_time(session_id, elapsed_ns)
+        
+        notes = _DETECTION_NOTE + detection_result.get("reason", "N/A")
+        if should_end:
+            notes = notes + _NOTE_SEPARATOR + _ENDED_NOTE + end_reason
+        
+        response = _NOT_ENGAGED_RESPONSE.copy()
+        response["extractedIntelligence"] = {field: [] for field in _INTELLIGENCE_FIELDS}
+        response["engagementMetrics"] = {
+            "conversationTurn": turn_count,
+            "responseTimeMs": elapsed_ns // 1_000_000,
+            "totalIntelligenceItems": 0,
+        }
+        response["continueConversation"] = not should_end
+        response["agentNotes"] = notes
+        
+        logger.info(f"Session {session_id}: Turn {turn_count}, not a scam, skipped engagement")
+        return response
+    
+    async def _detect(
+        self,
+        message_text: str,
+        history: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Run scam detection within the shared Gemini concurrency limit."""
+        if self.detection_batcher is not None:
+            return await self.detection_batcher.detect_scam(message_text, history)
+        async with self._llm_semaphore:
+            return await self.detector.detect_scam(message_text, history)
+    
+    async def _generate_response(
+        self,
+        message_text: str,
+        persona: str,
+        history: List[Dict[str, Any]]
+    ) -> str:
+        """Generate the actor's reply within the shared Gemini concurrency limit."""
+        async with self._llm_semaphore:
+            return await self.actor.generate_response(
+                message=message_text,
+                persona=persona,
+                history=history
+            )
+    
     def _build_response(
         self,
-        session: Dict[str, Any],
-        intel: Dict[str, List[str]],
+        session: Mapping[str, Any],
+        intel: Dict[str, Dict[str, None]],
         agent_response: str,
         turn_count: int,
         response_time_ms: int,
@@ -185,7 +436,7 @@ class Orchestrator:
         
         Args:
             session: Current session state
-            intel: Accumulated intelligence
+            intel: Accumulated intelligence, as insertion-ordered dicts
             agent_response: Generated response text
             turn_count: Current turn number
             response_time_ms: Processing time in milliseconds
@@ -196,30 +447,30 @@ class Orchestrator:
         Returns:
             GUVI-compliant response dict
         """
-        # Calculate total intelligence items
-        total_intel = sum(len(v) for v in intel.values())
+        # Running total kept by SessionManager as intelligence is added
+        total_intel = session["total_intelligence_items"]
         
         # Build agent notes
         notes_parts = []
         if detection_result:
-            notes_parts.append(f"Detection: {detection_result.get('reason', 'N/A')}")
+            notes_parts.append(_DETECTION_NOTE + detection_result.get("reason", "N/A"))
         if session["persona_used"]:
-            notes_parts.append(f"Persona: {session['persona_used']}")
+            notes_parts.append(_PERSONA_NOTE + session["persona_used"])
         if end_reason:
-            notes_parts.append(f"Ended: {end_reason}")
+            notes_parts.append(_ENDED_NOTE + end_reason)
         
-        agent_notes = ". ".join(notes_parts) if notes_parts else ""
+        agent_notes = _NOTE_SEPARATOR.join(notes_parts)
         
         return {
             "status": "success",
             "scamDetected": session["scam_detected"],
             "agentResponse": agent_response,
             "extractedIntelligence": {
-                "bankAccounts": intel.get("bankAccounts", []),
-                "upiIds": intel.get("upiIds", []),
-                "phishingLinks": intel.get("phishingLinks", []),
-                "phoneNumbers": intel.get("phoneNumbers", []),
-                "suspiciousKeywords": intel.get("suspiciousKeywords", []),
+                "bankAccounts": list(intel.get("bankAccounts", ())),
+                "upiIds": list(intel.get("upiIds", ())),
+                "phishingLinks": list(intel.get("phishingLinks", ())),
+                "phoneNumbers": list(intel.get("phoneNumbers", ())),
+                "suspiciousKeywords": list(intel.get("suspiciousKeywords", ())),
             },
             "engagementMetrics": {
                 "conversationTurn": turn_count,
@@ -258,6 +509,10 @@ class Orchestrator:
             self.session_manager.end_session(session_id, reason)
             return True
         return False
+    
+    def close(self) -> None:
+        """Release resources held by the agents, such as the detection result store."""
+        self.detector.close()
 
 
 def create_orchestrator(
@@ -266,7 +521,15 @@ def create_orchestrator(
     max_turns: int = 20,
     min_intelligence_types: int = 2,
     stale_threshold: int = 5,
-    scam_confidence_threshold: float = 0.3
+    scam_confidence_threshold: float = 0.3,
+    gemini_rpm: int = 60,
+    gemini_tpm: int = 0,
+    detection_store_path: str = "",
+    detection_store_ttl: int = 86400,
+    max_concurrent_llm: int = 32,
+    detection_batch_size: int = 1,
+    detection_batch_wait_ms: int = 20,
+    speculative_response: bool = False
 ) -> Orchestrator:
     """
     Factory function to create a fully configured Orchestrator.
@@ -278,12 +541,35 @@ def create_orchestrator(
         min_intelligence_types: Minimum intelligence types for ending
         stale_threshold: Turns without intel before ending
         scam_confidence_threshold: Minimum confidence to engage
+        gemini_rpm: Gemini requests per minute shared by both agents (0 = unlimited)
+        gemini_tpm: Gemini tokens per minute shared by both agents (0 = unlimited)
+        detection_store_path: SQLite file for persisting detection results
+            across restarts (empty disables it)
+        detection_store_ttl: Seconds a persisted detection result stays valid
+        max_concurrent_llm: Maximum Gemini calls in flight across sessions
+        detection_batch_size: Messages combined per detection call (1 disables batching)
+        detection_batch_wait_ms: Milliseconds to wait for a detection batch to fill
+        speculative_response: Generate the first reply in parallel with detection
         
     Returns:
         Configured Orchestrator instance
     """
-    detector = DetectorAgent(api_key=api_key, model_name=model_name)
-    actor = ActorAgent(api_key=api_key, model_name=model_name)
+    limiter = create_limiter(gemini_rpm, gemini_tpm)
+    result_store = (
+        ResultStore(detection_store_path, ttl_seconds=detection_store_ttl)
+        if detection_store_path else None
+    )
+    detector = DetectorAgent(
+        api_key=api_key,
+        model_name=model_name,
+        limiter=limiter,
+        result_store=result_store
+    )
+    detection_batcher = (
+        DetectionBatcher(detector, detection_batch_size, detection_batch_wait_ms)
+        if detection_batch_size > 1 else None
+    )
+    actor = ActorAgent(api_key=api_key, model_name=model_name, limiter=limiter)
     investigator = InvestigatorAgent()
     session_manager = SessionManager(
         max_turns=max_turns,
@@ -296,5 +582,8 @@ def create_orchestrator(
         actor=actor,
         investigator=investigator,
         session_manager=session_manager,
-        scam_confidence_threshold=scam_confidence_threshold
+        scam_confidence_threshold=scam_confidence_threshold,
+        max_concurrent_llm=max_concurrent_llm,
+        detection_batcher=detection_batcher,
+        speculative_response=speculative_response
     )
@@ -7,7 +7,10 @@ Contains:
 - System prompts for each persona type
 """
 
-from typing import List, Dict
+import random
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional
 
 
 # =============================================================================
@@ -47,28 +50,78 @@ You MUST respond with ONLY valid JSON in this exact format:
 Be STRICT: Only assign confidence > 0.7 for clear scams with multiple indicators."""
 
 
-def build_detector_prompt(message: str, history: List[Dict] = None) -> str:
+_DETECTOR_PROMPT_SUFFIX = "\nRespond with ONLY the JSON object, no other text."
+
+
+def render_detector_history(history: Optional[List[Dict]]) -> str:
+    """
+    Render the conversation context block of the detector prompt.
+    
+    Args:
+        history: Optional conversation history
+        
+    Returns:
+        Context block for the last 5 turns, or "" without history
+    """
+    if not history:
+        return ""
+    
+    parts = ["\n## Previous conversation context:\n"]
+    for turn in history[-5:]:  # Last 5 turns for context
+        sender = turn.get("sender", "unknown")
+        text = turn.get("text", "")
+        parts.append(f"- {sender}: {text}\n")
+    return "".join(parts)
+
+
+def build_detector_prompt(
+    message: str,
+    history: List[Dict] = None,
+    history_text: Optional[str] = None
+) -> str:
     """
     Build the detector prompt with message and optional history.
     
     Args:
         message: The message to analyze
         history: Optional conversation history for context
+        history_text: History already rendered by render_detector_history,
+            used instead of history when given
         
     Returns:
         Complete prompt string for the detector agent
     """
-    prompt = f"Analyze this message for scam intent:\n\n\"{message}\"\n"
+    if history_text is None:
+        history_text = render_detector_history(history)
     
-    if history and len(history) > 0:
-        prompt += "\n## Previous conversation context:\n"
-        for turn in history[-5:]:  # Last 5 turns for context
-            sender = turn.get("sender", "unknown")
-            text = turn.get("text", "")
-            prompt += f"- {sender}: {text}\n"
+    return (
+        f"Analyze this message for scam intent:\n\n\"{message}\"\n"
+        f"{history_text}{_DETECTOR_PROMPT_SUFFIX}"
+    )
+
+
+_DETECTOR_BATCH_PROMPT_SUFFIX = (
+    "\nRespond with ONLY a JSON array containing one JSON object per message, "
+    "in the same order as the messages, no other text."
+)
+
+
+def build_detector_batch_prompt(messages: List[str]) -> str:
+    """
+    Build a detector prompt that classifies several messages in one call.
     
-    prompt += "\nRespond with ONLY the JSON object, no other text."
-    return prompt
+    Args:
+        messages: Messages to analyze, each independently
+        
+    Returns:
+        Complete prompt string asking for a JSON array of verdicts
+    """
+    parts = [f"Analyze each of these {len(messages)} messages for scam intent independently:\n\n"]
+    for number, message in enumerate(messages, 1):
+        parts.append(f"{number}. \"{message}\"\n")
+    
+    parts.append(_DETECTOR_BATCH_PROMPT_SUFFIX)
+    return "".join(parts)
 
 
 # =============================================================================
@@ -151,7 +204,32 @@ PERSONA_PROMPTS = {
 }
 
 
-def build_actor_prompt(message: str, persona: str, history: List[Dict] = None) -> str:
+_ACTOR_PROMPT_SUFFIX = """Generate your response as this character would naturally reply.
+Remember:
+- Stay in character
+- Keep it SHORT (under 150 characters ideally)
+- Show appropriate emotion for your persona
+- Ask questions to keep them engaged
+- NEVER reveal you know it's a scam
+
+Reply with ONLY your message, no quotes or explanations."""
+
+
+_SITUATION_HEADER = "## Current Situation:\n"
+
+# Static start of each persona's actor prompt, assembled once at import
+ACTOR_PROMPT_PREFIXES = {
+    persona: f"{persona_prompt}\n\n{_SITUATION_HEADER}"
+    for persona, persona_prompt in PERSONA_PROMPTS.items()
+}
+
+
+def build_actor_prompt(
+    message: str,
+    persona: str,
+    history: List[Dict] = None,
+    include_persona: bool = True
+) -> str:
     """
     Build the actor prompt with persona, message, and history.
     
@@ -159,39 +237,56 @@ def build_actor_prompt(message: str, persona: str, history: List[Dict] = None) -
         message: The scammer's latest message
         persona: One of "elderly", "professional", "novice"
         history: Conversation history
+        include_persona: Prepend the persona prompt (set False when it is
+            already supplied as the model's system instruction)
         
     Returns:
         Complete prompt string for the actor agent
     """
-    persona_prompt = PERSONA_PROMPTS.get(persona, PERSONA_PROMPTS["elderly"])
-    
-    prompt = f"{persona_prompt}\n\n"
-    prompt += "## Current Situation:\n"
+    if include_persona:
+        prefix = ACTOR_PROMPT_PREFIXES.get(persona, ACTOR_PROMPT_PREFIXES["elderly"])
+    else:
+        prefix = _SITUATION_HEADER
+    parts = [prefix]
     
     if history and len(history) > 0:
-        prompt += "Previous conversation:\n"
+        parts.append("Previous conversation:\n")
         for turn in history[-6:]:  # Last 6 turns
             sender = turn.get("sender", "unknown")
             text = turn.get("text", "")
             if sender == "agent":
-                prompt += f"You: {text}\n"
+                parts.append(f"You: {text}\n")
             else:
-                prompt += f"Them: {text}\n"
+                parts.append(f"Them: {text}\n")
     
-    prompt += f"\nThe scammer just sent you this message:\n\"{message}\"\n\n"
-    prompt += """Generate your response as this character would naturally reply.
-Remember:
-- Stay in character
-- Keep it SHORT (under 150 characters ideally)
-- Show appropriate emotion for your persona
-- Ask questions to keep them engaged
-- NEVER reveal you know it's a scam
-
-Reply with ONLY your message, no quotes or explanations."""
+    parts.append(f"\nThe scammer just sent you this message:\n\"{message}\"\n\n")
+    parts.append(_ACTOR_PROMPT_SUFFIX)
     
-    return prompt
+    return "".join(parts)
+
+
+# Scam type keywords per persona, in priority order:
+# - elderly works best for emotional manipulation scams
+# - professional for business/banking scams
+# - novice for tech/job scams
+PERSONA_SCAM_TYPES = (
+    ("elderly", ("lottery", "prize", "government", "emergency", "family")),
+    ("professional", ("banking", "loan", "investment", "business")),
+    ("novice", ("job", "delivery", "otp", "subscription")),
+)
+_KEYWORD_TO_PERSONA = {
+    keyword: persona
+    for persona, keywords in PERSONA_SCAM_TYPES
+    for keyword in keywords
+}
+_PERSONA_PRIORITY = {persona: rank for rank, (persona, _) in enumerate(PERSONA_SCAM_TYPES)}
+# Zero-width lookahead so overlapping keywords are all reported
+_PERSONA_KEYWORD_PATTERN = re.compile(
+    "(?=(" + "|".join(re.escape(keyword) for keyword in _KEYWORD_TO_PERSONA) + "))"
+)
 
 
+@lru_cache(maxsize=32)
 def get_persona_for_scam_type(scam_type: str, channel: str = "sms") -> str:
     """
     Select the best persona based on scam type and channel.
@@ -203,28 +298,16 @@ def get_persona_for_scam_type(scam_type: str, channel: str = "sms") -> str:
     Returns:
         Persona name: "elderly", "professional", or "novice"
     """
-    # Elderly persona works best for emotional manipulation scams
-    elderly_types = ["lottery", "prize", "government", "emergency", "family"]
-    
-    # Professional for business/banking scams
-    professional_types = ["banking", "loan", "investment", "business"]
-    
-    # Novice for tech/job scams
-    novice_types = ["job", "delivery", "otp", "subscription"]
-    
     scam_lower = scam_type.lower() if scam_type else ""
     
-    for type_keyword in elderly_types:
-        if type_keyword in scam_lower:
-            return "elderly"
-    
-    for type_keyword in professional_types:
-        if type_keyword in scam_lower:
-            return "professional"
-    
-    for type_keyword in novice_types:
-        if type_keyword in scam_lower:
-            return "novice"
+    # One scan for all keywords; the earliest persona in
+    # PERSONA_SCAM_TYPES wins when several match
+    matched = _PERSONA_KEYWORD_PATTERN.findall(scam_lower)
+    if matched:
+        return min(
+            (_KEYWORD_TO_PERSONA[keyword] for keyword in matched),
+            key=_PERSONA_PRIORITY.__getitem__
+        )
     
     # Default to elderly as they are most commonly targeted
     return "elderly"
@@ -249,6 +332,12 @@ COMMON_TYPOS = {
     "bank": ["bakn", "bnk"],
 }
 
+# Whole whitespace-delimited words that have a typo variant
+_TYPO_WORD_PATTERN = re.compile(
+    r"(?<!\S)(?:" + "|".join(re.escape(word) for word in COMMON_TYPOS) + r")(?!\S)",
+    re.IGNORECASE
+)
+
 
 def humanize_response(text: str, typo_probability: float = 0.05) -> str:
     """
@@ -261,20 +350,18 @@ def humanize_response(text: str, typo_probability: float = 0.05) -> str:
     Returns:
         Humanized text with occasional typos
     """
-    import random
-    
     if random.random() > typo_probability:
         return text
     
-    words = text.split()
-    for i, word in enumerate(words):
-        word_lower = word.lower()
-        if word_lower in COMMON_TYPOS and random.random() < typo_probability:
-            typo = random.choice(COMMON_TYPOS[word_lower])
+    # Scan only the words that have typos instead of splitting the text
+    for match in _TYPO_WORD_PATTERN.finditer(text):
+        if random.random() < typo_probability:
+            word = match.group(0)
+            typo = random.choice(COMMON_TYPOS[word.lower()])
             # Preserve original capitalization
             if word[0].isupper():
                 typo = typo.capitalize()
-            words[i] = typo
-            break  # Only one typo per response
+            # Only one typo per response
+            return text[:match.start()] + typo + text[match.end():]
     
-    return " ".join(words)
+    return text
@@ -0,0 +1,183 @@
+"""
+Rate limiting and retry helpers for Gemini calls.
+
+Gemini enforces quotas on requests per minute (RPM) and tokens per minute
+(TPM). GeminiLimiter keeps both agents under those quotas with a shared
+token bucket per dimension, and backoff_delay spaces out retries after
+transient failures.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# Errors worth retrying: quota pressure and transient server-side failures
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at a fixed per-minute rate.
+
+    The bucket starts full, so up to one minute of quota can be spent in a
+    burst before callers are made to wait.
+    """
+
+    def __init__(self, per_minute: int):
+        """
+        Initialize the bucket.
+
+        Args:
+            per_minute: Tokens added per minute, also the bucket capacity
+        """
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float) -> float:
+        """
+        Get the seconds until amount tokens are available.
+
+        Args:
+            amount: Tokens required
+
+        Returns:
+            Seconds to wait, 0.0 if the tokens are available now
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float) -> None:
+        """Take amount tokens (capped at capacity) out of the bucket."""
+        self.tokens -= min(amount, self.capacity)
+
+
+class GeminiLimiter:
+    """
+    Async limiter enforcing Gemini RPM and TPM quotas.
+
+    Share one instance between all agents calling the same API key so
+    their combined traffic stays within quota.
+    """
+
+    def __init__(self, rpm: int = 60, tpm: int = 0):
+        """
+        Initialize the limiter.
+
+        Args:
+            rpm: Requests per minute (0 disables the request limit)
+            tpm: Tokens per minute (0 disables the token limit)
+        """
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+
+        logger.info(f"GeminiLimiter initialized: rpm={rpm}, tpm={tpm}")
+
+    async def acquire(self, estimated_tokens: int = 0) -> None:
+        """
+        Wait until one request of estimated_tokens fits in both quotas.
+
+        Args:
+            estimated_tokens: Estimated prompt plus output tokens
+        """
+        while True:
+            # Check and consume without awaiting in between, so concurrent
+            # callers on the event loop cannot both take the same tokens
+            wait = 0.0
+            if self.requests is not None:
+                wait = self.requests.wait_time(1)
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.wait_time(estimated_tokens))
+
+            if wait <= 0:
+                if self.requests is not None:
+                    self.requests.consume(1)
+                if self.tokens is not None:
+                    self.tokens.consume(estimated_tokens)
+                return
+
+            logger.debug(f"Rate limit reached, waiting {wait:.2f}s")
+            await asyncio.sleep(wait)
+
+
+def estimate_tokens(prompt: str, max_output_tokens: int) -> int:
+    """
+    Roughly estimate the tokens a request will use.
+
+    Args:
+        prompt: Prompt text (about four characters per token)
+        max_output_tokens: Output token ceiling for the model
+
+    Returns:
+        Estimated total tokens
+    """
+    return len(prompt) // 4 + max_output_tokens
+
+
+def backoff_delay(attempt: int, base: float = 0.25, cap: float = 30.0) -> float:
+    """
+    Get an exponential backoff delay with jitter.
+
+    Args:
+        attempt: Zero-based attempt number that just failed
+        base: Delay for the first retry
+        cap: Maximum delay before jitter
+
+    Returns:
+        Seconds to sleep before the next attempt
+    """
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Check whether a failed Gemini call is worth retrying.
+
+    API errors are retried only when transient (quota, timeouts, server
+    errors); others such as InvalidArgument or PermissionDenied fail fast.
+    Non-API errors (e.g. unparseable output) are retried, since another
+    sample may succeed.
+
+    Args:
+        error: Exception raised by the attempt
+
+    Returns:
+        True if the call should be retried
+    """
+    if isinstance(error, google_exceptions.GoogleAPICallError):
+        return isinstance(error, RETRYABLE_ERRORS)
+    return True
+
+
+def create_limiter(rpm: int, tpm: int) -> Optional[GeminiLimiter]:
+    """
+    Create a limiter, or None when both limits are disabled.
+
+    Args:
+        rpm: Requests per minute (0 disables)
+        tpm: Tokens per minute (0 disables)
+
+    Returns:
+        GeminiLimiter instance or None
+    """
+    if rpm <= 0 and tpm <= 0:
+        return None
+    return GeminiLimiter(rpm=rpm, tpm=tpm)
@@ -0,0 +1,124 @@
+"""
+Persistent store for detection results.
+
+Scam campaigns resend the same text to many recipients, and the honeypot
+restarts often. ResultStore keeps Gemini verdicts in a local SQLite file
+keyed by a hash of the message and its context, so repeat messages skip
+the model call even after a restart.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+import orjson
+
+logger = logging.getLogger(__name__)
+
+
+def result_key(message: str, context: Iterable[str] = ()) -> bytes:
+    """
+    Build a compact key for a message and the context it was analyzed in.
+
+    Args:
+        message: Message text
+        context: Other text that influenced the result (e.g. recent history)
+
+    Returns:
+        16-byte BLAKE2b digest
+    """
+    digest = hashlib.blake2b(message.encode("utf-8"), digest_size=16)
+    for part in context:
+        digest.update(b"\x00")
+        digest.update(part.encode("utf-8"))
+    return digest.digest()
+
+
+class ResultStore:
+    """
+    SQLite-backed key/value store for JSON-serializable results with a TTL.
+
+    Attributes:
+        path: Database file path
+        ttl_seconds: How long a stored result stays valid
+    """
+
+    def __init__(self, path: str, ttl_seconds: int = 86400):
+        """
+        Open (or create) the store and drop expired entries.
+
+        Args:
+            path: Database file path
+            ttl_seconds: How long a stored result stays valid
+        """
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key BLOB PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+        removed = self.sweep()
+        logger.info(f"ResultStore opened at {path} ({removed} expired entries removed)")
+
+    def get(self, key: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Get a stored result.
+
+        Args:
+            key: Key from result_key()
+
+        Returns:
+            Stored result, or None if missing or expired
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM results WHERE key = ?", (key,)
+            ).fetchone()
+
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return None
+        return orjson.loads(row[0])
+
+    def put(self, key: bytes, value: Dict[str, Any]) -> None:
+        """
+        Store a result, replacing any previous one.
+
+        Args:
+            key: Key from result_key()
+            value: JSON-serializable result
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, created_at) VALUES (?, ?, ?)",
+                (key, orjson.dumps(value), time.time()),
+            )
+            self._conn.commit()
+
+    def sweep(self) -> int:
+        """
+        Delete expired entries.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM results WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -5,13 +5,73 @@ Handles session creation, intelligence accumulation, and conversation
 end-condition logic.
 """
 
+import asyncio
+import functools
 import logging
 import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+# Intelligence types that count as high-value evidence
+HIGH_VALUE_INTEL_TYPES = frozenset({"bankAccounts", "upiIds", "phoneNumbers", "phishingLinks"})
+
+# Number of session map shards, each with its own insertion lock; a power of two
+SESSION_SHARDS = 16
+
+
+@functools.lru_cache(maxsize=4)
+def _iso_for_second(second: int) -> str:
+    """Format an epoch second as a local ISO timestamp."""
+    return datetime.fromtimestamp(second).isoformat()
+
+
+def now_iso() -> str:
+    """
+    Get the current time as an ISO string, at one-second resolution.
+    
+    Sessions are stamped on every update and the health endpoints report
+    the time on every request; caching the formatted string per second
+    avoids building a datetime and formatting it each time.
+    """
+    return _iso_for_second(int(time.time()))
+
+
+# Intelligence categories tracked per session
+INTELLIGENCE_TYPES = ("bankAccounts", "upiIds", "phoneNumbers", "phishingLinks", "suspiciousKeywords")
+
+# Initial session state. Values are immutable or placeholders (None) that
+# _create_new_session replaces with per-session objects, so a shallow copy
+# is a fresh session.
+_SESSION_TEMPLATE: Dict[str, Any] = {
+    "session_id": None,
+    "_lock": None,
+    # asyncio.Lock serializing the session's turns
+    "_turn_lock": None,
+    "turn_count": 0,
+    "scam_detected": False,
+    "scam_confidence": 0.0,
+    "persona_used": None,
+    # Insertion-ordered dicts used as sets: O(1) dedup, stable order
+    "intelligence": None,
+    "total_intelligence_items": 0,
+    # (turn_count, last_intelligence_turn, non-empty intelligence types,
+    # high-value items), rebound as a whole by writers so
+    # should_end_conversation can read a consistent set without locking
+    "_counters": (0, 0, 0, 0),
+    "total_processing_ns": 0,
+    "conversation_active": True,
+    "last_intelligence_turn": 0,
+    "end_reason": None,
+    "created_at": None,
+    # Epoch seconds for cheap age checks; created_at is for reporting
+    "_created_ts": None,
+    "updated_at": None,
+}
+
 
 class SessionManager:
     """
@@ -20,9 +80,10 @@ class SessionManager:
     Tracks conversation state, accumulates intelligence across turns,
     and determines when to end conversations.
     
-    Attributes:
-        sessions: Dict mapping session_id to session state
-        lock: Thread lock for concurrent access
+    Sessions are spread over SESSION_SHARDS (dict, lock) pairs by hash of
+    the session ID. A shard's lock only guards insertion and removal in that
+    shard; each session's fields are guarded by the session's own "_lock",
+    so unrelated sessions never contend.
     """
     
     def __init__(
@@ -39,8 +100,9 @@ class SessionManager:
             min_intelligence_types: Minimum types of intelligence to collect
             stale_threshold: Turns without new intel before ending
         """
-        self.sessions: Dict[str, Dict[str, Any]] = {}
-        self.lock = threading.Lock()
+        self._shards: Tuple[Tuple[Dict[str, Dict[str, Any]], threading.Lock], ...] = tuple(
+            ({}, threading.Lock()) for _ in range(SESSION_SHARDS)
+        )
         
         # Configuration
         self.max_turns = max_turns
@@ -53,44 +115,75 @@ class SessionManager:
             f"stale_threshold={stale_threshold}"
         )
     
-    def get_or_create_session(self, session_id: str) -> Dict[str, Any]:
+    def lock_for(self, session_id: str) -> asyncio.Lock:
         """
-        Get an existing session or create a new one.
+        Get the async lock that serializes turns of a session.
+        
+        Each session has its own lock, stored on the session record and
+        removed with it, so one session's turns run in order while other
+        sessions never wait on them. Creates the session if needed.
         
         Args:
             session_id: Unique session identifier
             
         Returns:
-            Session state dict
+            The session's turn lock
         """
-        with self.lock:
-            if session_id not in self.sessions:
-                self.sessions[session_id] = self._create_new_session(session_id)
-                logger.info(f"Created new session: {session_id}")
+        return self._get_or_create(session_id)["_turn_lock"]
+    
+    def _shard(self, session_id: str) -> Tuple[Dict[str, Dict[str, Any]], threading.Lock]:
+        """Get the (sessions dict, lock) shard holding a session."""
+        return self._shards[hash(session_id) & (SESSION_SHARDS - 1)]
+    
+    def _get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a session without locking, or None if it does not exist."""
+        return self._shard(session_id)[0].get(session_id)
+    
+    def get_or_create_session(self, session_id: str) -> Mapping[str, Any]:
+        """
+        Get an existing session or create a new one.
+        
+        The returned view is live: it reflects later updates without another
+        call. Change the session through update_session, update_intelligence
+        and the other mutation methods.
+        
+        Args:
+            session_id: Unique session identifier
             
-            return self.sessions[session_id].copy()
+        Returns:
+            Read-only view of the session state
+        """
+        return MappingProxyType(self._get_or_create(session_id))
+    
+    def _get_or_create(self, session_id: str) -> Dict[str, Any]:
+        """Get the session record, creating it if it does not exist."""
+        # Lock-free hit path; double-check under the shard lock on a miss
+        sessions, lock = self._shard(session_id)
+        session = sessions.get(session_id)
+        if session is None:
+            with lock:
+                session = sessions.get(session_id)
+                if session is None:
+                    session = self._create_new_session(session_id)
+                    sessions[session_id] = session
+                    logger.info(f"Created new session: {session_id}")
+        
+        return session
     
     def _create_new_session(self, session_id: str) -> Dict[str, Any]:
         """Create a new session state structure."""
-        return {
-            "session_id": session_id,
-            "turn_count": 0,
-            "scam_detected": False,
-            "scam_confidence": 0.0,
-            "persona_used": None,
-            "intelligence": {
-                "bankAccounts": [],
-                "upiIds": [],
-                "phoneNumbers": [],
-                "phishingLinks": [],
-                "suspiciousKeywords": [],
-            },
-            "conversation_active": True,
-            "last_intelligence_turn": 0,
-            "end_reason": None,
-            "created_at": datetime.now().isoformat(),
-            "updated_at": datetime.now().isoformat(),
-        }
+        # Copying the template's immutable defaults is cheaper than building
+        # the dict key by key; only per-session objects are created here
+        now = now_iso()
+        session = _SESSION_TEMPLATE.copy()
+        session["session_id"] = session_id
+        session["_lock"] = threading.Lock()
+        session["_turn_lock"] = asyncio.Lock()
+        session["intelligence"] = {intel_type: {} for intel_type in INTELLIGENCE_TYPES}
+        session["created_at"] = now
+        session["_created_ts"] = time.time()
+        session["updated_at"] = now
+        return session
     
     def update_session(
         self,
@@ -108,20 +201,21 @@ class SessionManager:
             scam_confidence: Detection confidence
             persona_used: Persona being used
         """
-        with self.lock:
-            if session_id not in self.sessions:
-                return
-            
-            session = self.sessions[session_id]
-            
-            if scam_detected is not None:
-                session["scam_detected"] = scam_detected
-            if scam_confidence is not None:
-                session["scam_confidence"] = scam_confidence
-            if persona_used is not None:
-                session["persona_used"] = persona_used
-            
-            session["updated_at"] = datetime.now().isoformat()
+        # Collect the changes first so the lock is held for one update
+        updates: Dict[str, Any] = {"updated_at": now_iso()}
+        if scam_detected is not None:
+            updates["scam_detected"] = scam_detected
+        if scam_confidence is not None:
+            updates["scam_confidence"] = scam_confidence
+        if persona_used is not None:
+            updates["persona_used"] = persona_used
+        
+        session = self._get(session_id)
+        if session is None:
+            return
+        
+        with session["_lock"]:
+            session.update(updates)
     
     def update_intelligence(
         self,
@@ -138,31 +232,41 @@ class SessionManager:
         Returns:
             True if new unique intelligence was added
         """
-        with self.lock:
-            if session_id not in self.sessions:
-                return False
-            
-            session = self.sessions[session_id]
+        session = self._get(session_id)
+        if session is None:
+            return False
+        
+        with session["_lock"]:
             existing = session["intelligence"]
             
             # Track if we added anything new
             added_new = False
+            turn, last_intel_turn, intel_types, high_value = session["_counters"]
             
-            for key in existing.keys():
-                new_items = set(new_intel.get(key, []))
-                existing_items = set(existing[key])
+            for key, items in existing.items():
+                new_items = new_intel.get(key)
+                if not new_items:
+                    continue
                 
-                unique_new = new_items - existing_items
-                if unique_new:
-                    existing[key] = list(existing_items.union(new_items))
+                before = len(items)
+                items.update(dict.fromkeys(new_items))
+                added = len(items) - before
+                if added:
+                    session["total_intelligence_items"] += added
+                    if before == 0:
+                        intel_types += 1
+                    if key in HIGH_VALUE_INTEL_TYPES:
+                        high_value += added
                     added_new = True
-                    logger.debug(f"Added new {key}: {unique_new}")
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"Added {added} new {key}")
             
             if added_new:
-                session["last_intelligence_turn"] = session["turn_count"]
-                logger.info(f"Session {session_id}: New intelligence added at turn {session['turn_count']}")
+                session["last_intelligence_turn"] = turn
+                session["_counters"] = (turn, turn, intel_types, high_value)
+                logger.info(f"Session {session_id}: New intelligence added at turn {turn}")
             
-            session["updated_at"] = datetime.now().isoformat()
+            session["updated_at"] = now_iso()
             return added_new
     
     def increment_turn(self, session_id: str) -> int:
@@ -175,17 +279,33 @@ class SessionManager:
         Returns:
             New turn count
         """
-        with self.lock:
-            if session_id not in self.sessions:
-                return 0
-            
-            self.sessions[session_id]["turn_count"] += 1
-            turn = self.sessions[session_id]["turn_count"]
-            self.sessions[session_id]["updated_at"] = datetime.now().isoformat()
+        session = self._get(session_id)
+        if session is None:
+            return 0
+        
+        with session["_lock"]:
+            turn = session["turn_count"] + 1
+            session["turn_count"] = turn
+            session["_counters"] = (turn,) + session["_counters"][1:]
+            session["updated_at"] = now_iso()
             
-            logger.debug(f"Session {session_id}: Turn count now {turn}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Session {session_id}: Turn count now {turn}")
             return turn
     
+    def add_processing_time(self, session_id: str, elapsed_ns: int) -> None:
+        """
+        Add one turn's processing time to the session's running total.
+        
+        Args:
+            session_id: Session identifier
+            elapsed_ns: Turn duration in nanoseconds
+        """
+        session = self._get(session_id)
+        if session is not None:
+            with session["_lock"]:
+                session["total_processing_ns"] += elapsed_ns
+    
     def should_end_conversation(self, session_id: str) -> tuple[bool, str]:
         """
         Determine if the conversation should end.
@@ -201,41 +321,34 @@ class SessionManager:
         Returns:
             Tuple of (should_end: bool, reason: str)
         """
-        with self.lock:
-            if session_id not in self.sessions:
-                return True, "session_not_found"
-            
-            session = self.sessions[session_id]
-            
-            # Check if already ended
-            if not session["conversation_active"]:
-                return True, session.get("end_reason", "already_ended")
-            
-            turn = session["turn_count"]
-            intel = session["intelligence"]
-            last_intel_turn = session["last_intelligence_turn"]
-            
-            # Count intelligence types with items
-            intel_types = sum(1 for v in intel.values() if len(v) > 0)
-            
-            # Condition 1: Enough intelligence types
-            if intel_types >= self.min_intelligence_types:
-                # Require at least one high-value item
-                high_value = sum(len(intel.get(k, [])) for k in 
-                               ["bankAccounts", "upiIds", "phoneNumbers", "phishingLinks"])
-                if high_value >= 1:
-                    return True, "sufficient_intelligence"
-            
-            # Condition 2: Max turns reached
-            if turn >= self.max_turns:
-                return True, "max_turns_reached"
-            
-            # Condition 3: Stale conversation
-            turns_since_intel = turn - last_intel_turn
-            if turn > 3 and turns_since_intel >= self.stale_threshold:
-                return True, "stale_conversation"
-            
-            return False, ""
+        session = self._get(session_id)
+        if session is None:
+            return True, "session_not_found"
+        
+        # No lock needed: the flag is a single read and the counters are
+        # read as one atomically rebound tuple
+        
+        # Check if already ended
+        if not session["conversation_active"]:
+            return True, session.get("end_reason", "already_ended")
+        
+        turn, last_intel_turn, intel_types, high_value = session["_counters"]
+        
+        # Condition 1: Enough intelligence types, with at least one
+        # high-value item
+        if intel_types >= self.min_intelligence_types and high_value >= 1:
+            return True, "sufficient_intelligence"
+        
+        # Condition 2: Max turns reached
+        if turn >= self.max_turns:
+            return True, "max_turns_reached"
+        
+        # Condition 3: Stale conversation
+        turns_since_intel = turn - last_intel_turn
+        if turn > 3 and turns_since_intel >= self.stale_threshold:
+            return True, "stale_conversation"
+        
+        return False, ""
     
     def end_session(self, session_id: str, reason: str) -> None:
         """
@@ -245,12 +358,19 @@ class SessionManager:
             session_id: Session identifier
             reason: Reason for ending
         """
-        with self.lock:
-            if session_id in self.sessions:
-                self.sessions[session_id]["conversation_active"] = False
-                self.sessions[session_id]["end_reason"] = reason
-                self.sessions[session_id]["updated_at"] = datetime.now().isoformat()
-                logger.info(f"Session {session_id} ended: {reason}")
+        session = self._get(session_id)
+        if session is None:
+            return
+        
+        # Turns after the end re-report the same reason; skip the lock then
+        if not session["conversation_active"] and session["end_reason"] == reason:
+            return
+        
+        with session["_lock"]:
+            session["conversation_active"] = False
+            session["end_reason"] = reason
+            session["updated_at"] = now_iso()
+            logger.info(f"Session {session_id} ended: {reason}")
     
     def get_session_summary(self, session_id: str) -> Dict[str, Any]:
         """
@@ -262,32 +382,41 @@ class SessionManager:
         Returns:
             Session summary dict
         """
-        with self.lock:
-            if session_id not in self.sessions:
-                return {"error": "session_not_found"}
-            
-            session = self.sessions[session_id]
+        session = self._get(session_id)
+        if session is None:
+            return {"error": "session_not_found"}
+        
+        with session["_lock"]:
             intel = session["intelligence"]
             
             return {
                 "sessionId": session_id,
                 "scamDetected": session["scam_detected"],
                 "totalMessagesExchanged": session["turn_count"],
-                "extractedIntelligence": intel.copy(),
+                "extractedIntelligence": {key: list(items) for key, items in intel.items()},
                 "personaUsed": session["persona_used"],
                 "endReason": session.get("end_reason"),
-                "highValueIntelCount": sum(
-                    len(intel.get(k, [])) for k in 
-                    ["bankAccounts", "upiIds", "phoneNumbers", "phishingLinks"]
-                ),
+                "highValueIntelCount": session["_counters"][3],
                 "createdAt": session["created_at"],
                 "updatedAt": session["updated_at"],
             }
     
     def get_all_sessions(self) -> Dict[str, Dict]:
         """Get all sessions (for debugging/admin)."""
-        with self.lock:
-            return {k: v.copy() for k, v in self.sessions.items()}
+        result = {}
+        for sessions, lock in self._shards:
+            with lock:
+                snapshot = list(sessions.items())
+            
+            for session_id, session in snapshot:
+                with session["_lock"]:
+                    public = {k: v for k, v in session.items() if not k.startswith("_")}
+                    # Copy the stored sets out as lists, as get_session_summary does
+                    public["intelligence"] = {
+                        key: list(items) for key, items in session["intelligence"].items()
+                    }
+                result[session_id] = public
+        return result
     
     def cleanup_old_sessions(self, max_age_hours: int = 24) -> int:
         """
@@ -299,21 +428,27 @@ class SessionManager:
         Returns:
             Number of sessions removed
         """
-        from datetime import timedelta
+        cutoff = time.time() - max_age_hours * 3600
         
-        with self.lock:
-            cutoff = datetime.now() - timedelta(hours=max_age_hours)
-            to_remove = []
-            
-            for session_id, session in self.sessions.items():
-                created = datetime.fromisoformat(session["created_at"])
-                if created < cutoff:
-                    to_remove.append(session_id)
-            
-            for session_id in to_remove:
-                del self.sessions[session_id]
+        removed = 0
+        
+        # Shards are cleaned one at a time so the others stay available;
+        # _created_ts never changes, so the scan needs no per-session locks
+        for sessions, lock in self._shards:
+            with lock:
+                snapshot = list(sessions.items())
             
-            if to_remove:
-                logger.info(f"Cleaned up {len(to_remove)} old sessions")
+            to_remove = [
+                session_id for session_id, session in snapshot
+                if session["_created_ts"] < cutoff
+            ]
             
-            return len(to_remove)
+            with lock:
+                for session_id in to_remove:
+                    sessions.pop(session_id, None)
+            removed += len(to_remove)
+        
+        if removed:
+            logger.info(f"Cleaned up {removed} old sessions")
+        
+        return removed
@@ -8,6 +8,15 @@ Contains:
 - GUVI callback handler
 """
 
+import os
+import sys
+
+# Make the project root importable (for config and agents) once, for every
+# module in this package
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
 from .main import app
 
 __all__ = ["app"]
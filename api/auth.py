@@ -4,15 +4,13 @@ API authentication middleware and utilities.
 Provides API key validation for the Honeypot agent endpoints.
 """
 
+import hmac
 import logging
 from typing import Optional
 
 from fastapi import Header, HTTPException, Depends
 from fastapi.security import APIKeyHeader
 
-import sys
-import os
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
 
 logger = logging.getLogger(__name__)
@@ -20,6 +18,23 @@ logger = logging.getLogger(__name__)
 # API Key header configuration
 API_KEY_HEADER = APIKeyHeader(name="x-api-key", auto_error=False)
 
+# Headers sent with every 401 response
+_AUTH_HEADERS = {"WWW-Authenticate": "ApiKey"}
+
+# Configured secret, encoded once for constant-time comparison
+_secret: bytes = config.API_SECRET_KEY.encode()
+
+
+def reload_secret() -> None:
+    """Re-read the API secret from config, e.g. after a configuration reload."""
+    global _secret
+    _secret = config.API_SECRET_KEY.encode()
+
+
+def _is_valid_key(x_api_key: str) -> bool:
+    """Compare a key with the secret in constant time, avoiding a timing oracle."""
+    return hmac.compare_digest(x_api_key.encode(), _secret)
+
 
 async def verify_api_key(
     x_api_key: Optional[str] = Header(None, alias="x-api-key")
@@ -41,16 +56,16 @@ async def verify_api_key(
         raise HTTPException(
             status_code=401,
             detail="Missing API key. Include 'x-api-key' header.",
-            headers={"WWW-Authenticate": "ApiKey"},
+            headers=_AUTH_HEADERS,
         )
     
     # Validate against configured secret
-    if x_api_key != config.API_SECRET_KEY:
+    if not _is_valid_key(x_api_key):
         logger.warning(f"Invalid API key attempt: {x_api_key[:8]}...")
         raise HTTPException(
             status_code=401,
             detail="Invalid API key.",
-            headers={"WWW-Authenticate": "ApiKey"},
+            headers=_AUTH_HEADERS,
         )
     
     logger.debug("API key validated successfully")
@@ -72,7 +87,7 @@ async def optional_api_key(
     if not x_api_key:
         return None
     
-    if x_api_key == config.API_SECRET_KEY:
+    if _is_valid_key(x_api_key):
         return x_api_key
     
     return None
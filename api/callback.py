@@ -10,20 +10,38 @@ import asyncio
 from typing import Dict, Any, Optional
 
 import httpx
+import orjson
 
-import sys
-import os
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import config
 
 logger = logging.getLogger(__name__)
 
+# Connection pool limits for the shared callback client
+CLIENT_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+# Headers sent with every callback
+_JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Client errors worth retrying (timeout, rate limit); other 4xx fail fast
+_RETRYABLE_CLIENT_ERRORS = frozenset({408, 429})
+
+# Longest wait between callback attempts, in seconds
+MAX_RETRY_DELAY = 8
+
+# Agent notes when the summary has nothing to report
+_COMPLETED_NOTE = "Conversation completed."
+
+# Intelligence fields sent to GUVI, in payload order
+INTELLIGENCE_FIELDS = ("bankAccounts", "upiIds", "phishingLinks", "phoneNumbers", "suspiciousKeywords")
+
 
 class CallbackHandler:
     """
     Handler for sending callbacks to GUVI endpoint.
     
-    Implements retry logic with exponential backoff.
+    Implements retry logic with exponential backoff. One HTTP client is
+    kept for the life of the event loop, so keep-alive connections to the
+    endpoint are reused instead of repeating DNS and TLS setup per attempt.
     
     Attributes:
         callback_url: GUVI callback endpoint URL
@@ -52,6 +70,10 @@ class CallbackHandler:
         self.timeout = timeout or config.CALLBACK_TIMEOUT
         self.max_retries = max_retries
         self.enabled = enabled if enabled is not None else config.GUVI_CALLBACK_ENABLED
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop: Optional[asyncio.AbstractEventLoop] = None
+        # Callbacks being sent, so a session ended twice is only sent once
+        self._inflight: Dict[str, asyncio.Future] = {}
         
         logger.info(
             f"CallbackHandler initialized: enabled={self.enabled}, "
@@ -77,33 +99,66 @@ class CallbackHandler:
             logger.info(f"Callback disabled, skipping for session {session_id}")
             return True  # Return True as "successful" skip
         
-        # Build callback payload
+        # Join a callback already in flight for this session instead of
+        # racing it with a second POST
+        pending = self._inflight.get(session_id)
+        if pending is not None:
+            logger.info(f"Callback already in progress for session {session_id}")
+            return await asyncio.shield(pending)
+        
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[session_id] = future
+        success = False
+        try:
+            success = await self._send(session_id, final_data)
+        finally:
+            del self._inflight[session_id]
+            future.set_result(success)
+        return success
+    
+    async def _send(self, session_id: str, final_data: Dict[str, Any]) -> bool:
+        """
+        POST the callback, retrying transient failures.
+        
+        Args:
+            session_id: Session identifier
+            final_data: Session summary data
+            
+        Returns:
+            True if GUVI accepted the callback
+        """
+        # Build and serialize the payload once for all attempts
         payload = self._build_payload(session_id, final_data)
+        body = orjson.dumps(payload)
         
         logger.info(f"Sending callback for session {session_id} to {self.callback_url}")
         
         # Retry with exponential backoff: 2s, 4s, 8s
         for attempt in range(self.max_retries):
             try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(
-                        self.callback_url,
-                        json=payload,
-                        headers={"Content-Type": "application/json"}
+                client = self._get_client()
+                response = await client.post(
+                    self.callback_url,
+                    content=body,
+                    headers=_JSON_HEADERS
+                )
+                
+                if response.status_code in [200, 201, 202]:
+                    logger.info(
+                        f"Callback successful for session {session_id}: "
+                        f"status={response.status_code}"
                     )
-                    
-                    if response.status_code in [200, 201, 202]:
-                        logger.info(
-                            f"Callback successful for session {session_id}: "
-                            f"status={response.status_code}"
-                        )
-                        return True
-                    else:
-                        logger.warning(
-                            f"Callback returned {response.status_code} for session {session_id}: "
-                            f"{response.text[:200]}"
-                        )
-                        
+                    return True
+                
+                logger.warning(
+                    f"Callback returned {response.status_code} for session {session_id}: "
+                    f"{response.text[:200]}"
+                )
+                
+                # The request itself was rejected; resending it will not help
+                if 400 <= response.status_code < 500 and response.status_code not in _RETRYABLE_CLIENT_ERRORS:
+                    break
+                
             except httpx.TimeoutException:
                 logger.warning(
                     f"Callback timeout for session {session_id} "
@@ -121,17 +176,42 @@ class CallbackHandler:
                     f"Unexpected error during callback for session {session_id}: {str(e)}"
                 )
             
-            # Exponential backoff: 2, 4, 8 seconds
+            # Exponential backoff: 2, 4, 8 seconds, then 8 seconds
             if attempt < self.max_retries - 1:
-                delay = 2 ** (attempt + 1)
+                delay = min(2 ** (attempt + 1), MAX_RETRY_DELAY)
                 logger.info(f"Retrying callback in {delay} seconds...")
                 await asyncio.sleep(delay)
         
         logger.error(
-            f"All callback attempts failed for session {session_id}"
+            f"Callback failed for session {session_id}"
         )
         return False
     
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Get the pooled HTTP client, creating it for the running event loop.
+        
+        Connections belong to the loop that opened them, so a new client is
+        made if the handler is used from a different loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            # No pool timeout: under a burst of ending sessions, callbacks
+            # queue for one of the pooled connections rather than failing
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, pool=None),
+                limits=CLIENT_LIMITS
+            )
+            self._client_loop = loop
+        return self._client
+    
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client, e.g. on application shutdown."""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+    
     def _build_payload(
         self,
         session_id: str,
@@ -148,32 +228,33 @@ class CallbackHandler:
             Callback payload dict
         """
         # Extract intelligence safely
-        intel = final_data.get("extractedIntelligence", {})
+        intel = final_data.get("extractedIntelligence") or {}
         
-        # Build agent notes summary
-        notes_parts = []
-        if final_data.get("personaUsed"):
-            notes_parts.append(f"Persona: {final_data['personaUsed']}")
-        if final_data.get("endReason"):
-            notes_parts.append(f"End reason: {final_data['endReason']}")
-        if final_data.get("highValueIntelCount", 0) > 0:
-            notes_parts.append(
-                f"Extracted {final_data['highValueIntelCount']} high-value items"
-            )
+        persona = final_data.get("personaUsed")
+        end_reason = final_data.get("endReason")
+        high_value = final_data.get("highValueIntelCount", 0)
         
-        agent_notes = ". ".join(notes_parts) if notes_parts else "Conversation completed."
+        # Build agent notes summary; ended sessions usually have all three
+        if persona and end_reason and high_value > 0:
+            agent_notes = (
+                f"Persona: {persona}. End reason: {end_reason}. "
+                f"Extracted {high_value} high-value items"
+            )
+        else:
+            notes_parts = []
+            if persona:
+                notes_parts.append(f"Persona: {persona}")
+            if end_reason:
+                notes_parts.append(f"End reason: {end_reason}")
+            if high_value > 0:
+                notes_parts.append(f"Extracted {high_value} high-value items")
+            agent_notes = ". ".join(notes_parts) or _COMPLETED_NOTE
         
         return {
             "sessionId": session_id,
             "scamDetected": final_data.get("scamDetected", False),
             "totalMessagesExchanged": final_data.get("totalMessagesExchanged", 0),
-            "extractedIntelligence": {
-                "bankAccounts": intel.get("bankAccounts", []),
-                "upiIds": intel.get("upiIds", []),
-                "phishingLinks": intel.get("phishingLinks", []),
-                "phoneNumbers": intel.get("phoneNumbers", []),
-                "suspiciousKeywords": intel.get("suspiciousKeywords", []),
-            },
+            "extractedIntelligence": {field: intel.get(field) or [] for field in INTELLIGENCE_FIELDS},
             "agentNotes": agent_notes,
         }
     
@@ -7,6 +7,7 @@ Defines the schema for:
 - Intelligence structures
 """
 
+import uuid
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 from pydantic import BaseModel, Field
@@ -71,18 +72,25 @@ class IncomingMessage(BaseModel):
     
     def get_session_id(self) -> str:
         """Get session ID, generating one if not provided."""
-        import uuid
         return self.sessionId or f"auto-{uuid.uuid4().hex[:12]}"
     
     def get_normalized_message(self) -> Dict[str, Any]:
-        """Get normalized message dict."""
-        from datetime import datetime
+        """
+        Get normalized message dict.
+        
+        Its "text" is the same string get_message_text() returns, so callers
+        that need both can read it from here instead of extracting it again.
+        """
         text = self.get_message_text()
         if self.message and isinstance(self.message, dict):
+            # Only read the clock when the sender gave no timestamp
+            timestamp = self.message.get("timestamp")
+            if timestamp is None and "timestamp" not in self.message:
+                timestamp = datetime.now().isoformat()
             return {
                 "sender": self.message.get("sender", "unknown"),
                 "text": text,
-                "timestamp": self.message.get("timestamp", datetime.now().isoformat())
+                "timestamp": timestamp
             }
         return {
             "sender": "unknown",
@@ -8,9 +8,11 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Load .env file from project root
+# Load .env file from project root, when there is one. Deployments that set
+# the environment themselves can skip the lookup with PLUTUS_SKIP_DOTENV=1.
 env_path = Path(__file__).parent / ".env"
-load_dotenv(env_path)
+if os.getenv("PLUTUS_SKIP_DOTENV") != "1" and env_path.is_file():
+    load_dotenv(env_path)
 
 
 class Config:
@@ -26,6 +28,12 @@ class Config:
     # API SECURITY
     # ===========================================
     API_SECRET_KEY: str = os.getenv("API_SECRET_KEY", "default-dev-key-change-in-production")
+    # Comma-separated origins allowed by CORS; "*" allows any (development)
+    CORS_ALLOWED_ORIGINS: list = [
+        origin.strip()
+        for origin in os.getenv("CORS_ALLOWED_ORIGINS", "*").split(",")
+        if origin.strip()
+    ]
     
     # ===========================================
     # GUVI INTEGRATION
@@ -50,6 +58,19 @@ class Config:
     API_TIMEOUT: int = int(os.getenv("API_TIMEOUT", "30"))
     GEMINI_TIMEOUT: int = int(os.getenv("GEMINI_TIMEOUT", "10"))
     CALLBACK_TIMEOUT: int = int(os.getenv("CALLBACK_TIMEOUT", "10"))
+    GEMINI_RPM: int = int(os.getenv("GEMINI_RPM", "60"))  # 0 disables the limit
+    GEMINI_TPM: int = int(os.getenv("GEMINI_TPM", "0"))  # 0 disables the limit
+    MAX_CONCURRENT_LLM: int = int(os.getenv("MAX_CONCURRENT_LLM", "32"))
+    DETECTION_BATCH_SIZE: int = int(os.getenv("DETECTION_BATCH_SIZE", "1"))  # 1 disables batching
+    DETECTION_BATCH_WAIT_MS: int = int(os.getenv("DETECTION_BATCH_WAIT_MS", "20"))
+    DETECTION_STORE_PATH: str = os.getenv("DETECTION_STORE_PATH", "")  # Empty disables it
+    DETECTION_STORE_TTL: int = int(os.getenv("DETECTION_STORE_TTL", "86400"))
+    # Opt-in: costs an extra Gemini call on first messages that are not scams
+    SPECULATIVE_RESPONSE: bool = os.getenv("SPECULATIVE_RESPONSE", "false").lower() == "true"
+    REPLY_CACHE_SIZE: int = int(os.getenv("REPLY_CACHE_SIZE", "1024"))  # 0 disables the cache
+    REPLY_CACHE_TTL: int = int(os.getenv("REPLY_CACHE_TTL", "60"))
+    SESSION_MAX_AGE_HOURS: int = int(os.getenv("SESSION_MAX_AGE_HOURS", "24"))
+    SESSION_CLEANUP_INTERVAL: int = int(os.getenv("SESSION_CLEANUP_INTERVAL", "600"))  # 0 disables it
     
     @classmethod
     def validate(cls) -> bool:
@@ -11,11 +11,13 @@ Extracts:
 
 import re
 import logging
-from typing import Dict, List
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
 
 from .validators import (
     is_valid_bank_account,
-    is_valid_upi_id,
+    is_valid_upi_id_lower,
     is_valid_phone_number,
     is_valid_url,
     extract_clean_phone,
@@ -23,6 +25,58 @@ from .validators import (
 
 logger = logging.getLogger(__name__)
 
+# Prefilter: bank accounts and phone numbers both need digits
+_DIGIT_PATTERN = re.compile(r'\d')
+
+# Bank account: 9-18 digits, may have spaces or hyphens
+_BANK_ACCOUNT_PATTERN = re.compile(
+    r'\b(\d{4}[\s\-]?\d{4}[\s\-]?\d{1,10})\b'
+)
+
+# UPI ID: username@provider. The provider is matched as any short word and
+# checked against validators.UPI_PROVIDERS afterwards, which keeps one
+# provider list and avoids trying every provider branch at each '@'. The
+# username is capped at 64 characters (real handles are far shorter) so a
+# long run of word characters and dots fails in linear, not quadratic, time.
+# Applied to lowercased text, so no IGNORECASE.
+_UPI_ID_PATTERN = re.compile(r'\b([\w.\-]{1,64}@[a-z]{2,20})\b')
+
+# Indian phone number: +91 or starts with 6-9
+_PHONE_PATTERN = re.compile(
+    r'(?:\+91[\s\-]?)?(?:0)?([6-9]\d{9})\b'
+)
+
+# Full phone number including any +91 or 0 prefix, as used for extraction
+_FULL_PHONE_PATTERN = re.compile(r'(\+91[\s\-]?[6-9]\d{9}|\b0?[6-9]\d{9})\b')
+
+# URLs including shortened links
+_URL_PATTERN = re.compile(
+    r'((?:https?://|www\.)[^\s<>"\']+|'
+    r'(?:bit\.ly|tinyurl\.com|goo\.gl|t\.co|ow\.ly|is\.gd|'
+    r'buff\.ly|j\.mp|tr\.im)/[^\s<>"\']+)',
+    re.IGNORECASE
+)
+
+# Suspicious keywords commonly used in scams
+SCAM_KEYWORDS = (
+    "urgent", "immediately", "blocked", "suspended", "verify",
+    "otp", "password", "cvv", "expire", "limited time", "act now",
+    "account closed", "confirm identity", "click here", "update kyc",
+    "kyc update", "link expire", "bank notice", "rbi", "security alert",
+    "unusual activity", "unauthorized", "refund", "lottery", "prize",
+    "winner", "claim now", "last chance", "final notice", "warning",
+    "action required", "pan card", "aadhaar", "debit card", "credit card",
+    "pin", "atm", "transfer", "send money", "pay now", "payment failed",
+    "transaction failed", "account frozen", "legal action", "police",
+    "arrest", "case filed", "court", "fine", "penalty"
+)
+
+# Result keys of extract_all, in response order
+_RESULT_KEYS = ("bankAccounts", "upiIds", "phoneNumbers", "phishingLinks", "suspiciousKeywords")
+
+# (lowercase, original) keyword pairs, deduplicated, for extract_keywords
+_KEYWORD_MATCHERS = tuple((keyword.lower(), keyword) for keyword in dict.fromkeys(SCAM_KEYWORDS))
+
 
 class IntelligenceExtractor:
     """
@@ -34,54 +88,34 @@ class IntelligenceExtractor:
     
     Attributes:
         patterns: Dict of compiled regex patterns
-        scam_keywords: List of suspicious keywords to detect
     """
     
+    # Most distinct items of one type kept per message; a message carrying
+    # more is already flagged, and this bounds work and output on floods
+    MAX_ITEMS_PER_TYPE = 32
+    
+    # Results kept for repeated texts (campaigns resend the same message to
+    # many sessions); longer texts are not cached, which bounds memory
+    RESULT_CACHE_SIZE = 2048
+    RESULT_CACHE_MAX_TEXT = 4096
+    
     def __init__(self):
         """Initialize the extractor with regex patterns and keywords."""
-        # Compile regex patterns for efficiency
+        # Patterns are compiled once at import and shared by all instances
         self.patterns = {
-            # Bank account: 9-18 digits, may have spaces or hyphens
-            'bank_account': re.compile(
-                r'\b(\d{4}[\s\-]?\d{4}[\s\-]?\d{1,10})\b'
-            ),
-            
-            # UPI ID: username@provider
-            'upi_id': re.compile(
-                r'\b([\w.\-]+@(?:paytm|ybl|axisbank|oksbi|okicici|okhdfcbank|'
-                r'icici|sbi|hdfc|airtel|freecharge|jiomoney|mobikwik|apl|'
-                r'amazonpay|ibl|axl|upi|gpay|pingpay|kotak|pnb|federal|'
-                r'indus|rbl|yesbankltd|dbs|idfcbank))\b',
-                re.IGNORECASE
-            ),
-            
-            # Indian phone number: +91 or starts with 6-9
-            'phone': re.compile(
-                r'(?:\+91[\s\-]?)?(?:0)?([6-9]\d{9})\b'
-            ),
-            
-            # URLs including shortened links
-            'url': re.compile(
-                r'((?:https?://|www\.)[^\s<>"\']+|'
-                r'(?:bit\.ly|tinyurl\.com|goo\.gl|t\.co|ow\.ly|is\.gd|'
-                r'buff\.ly|j\.mp|tr\.im)/[^\s<>"\']+)',
-                re.IGNORECASE
-            ),
+            'bank_account': _BANK_ACCOUNT_PATTERN,
+            'upi_id': _UPI_ID_PATTERN,
+            'phone': _PHONE_PATTERN,
+            'phone_full': _FULL_PHONE_PATTERN,
+            'url': _URL_PATTERN,
         }
         
-        # Suspicious keywords commonly used in scams
-        self.scam_keywords = [
-            "urgent", "immediately", "blocked", "suspended", "verify",
-            "otp", "password", "cvv", "expire", "limited time", "act now",
-            "account closed", "confirm identity", "click here", "update kyc",
-            "kyc update", "link expire", "bank notice", "rbi", "security alert",
-            "unusual activity", "unauthorized", "refund", "lottery", "prize",
-            "winner", "claim now", "last chance", "final notice", "warning",
-            "action required", "pan card", "aadhaar", "debit card", "credit card",
-            "pin", "atm", "transfer", "send money", "pay now", "payment failed",
-            "transaction failed", "account frozen", "legal action", "police",
-            "arrest", "case filed", "court", "fine", "penalty"
-        ]
+        # Lowercased, deduplicated SCAM_KEYWORDS, built once at import
+        self._keyword_matchers = _KEYWORD_MATCHERS
+        
+        # LRU of text -> immutable result; extraction runs in worker threads
+        self._cache: "OrderedDict[str, Tuple[Tuple[str, ...], ...]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def extract_all(self, text: str) -> Dict[str, List[str]]:
         """
@@ -101,14 +135,45 @@ class IntelligenceExtractor:
         if not text:
             return self._empty_result()
         
-        logger.debug(f"Extracting intelligence from: {text[:100]}...")
+        cacheable = len(text) <= self.RESULT_CACHE_MAX_TEXT
+        if cacheable:
+            with self._cache_lock:
+                cached = self._cache.get(text)
+                if cached is not None:
+                    self._cache.move_to_end(text)
+            if cached is not None:
+                # Fresh lists, so callers may modify the result
+                return {key: list(items) for key, items in zip(_RESULT_KEYS, cached)}
+        
+        result = self._extract_uncached(text)
+        
+        if cacheable:
+            frozen = tuple(tuple(result[key]) for key in _RESULT_KEYS)
+            with self._cache_lock:
+                self._cache[text] = frozen
+                if len(self._cache) > self.RESULT_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        
+        return result
+    
+    def _extract_uncached(self, text: str) -> Dict[str, List[str]]:
+        """Run every extractor over non-empty text."""
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Extracting intelligence from: {text[:100]}...")
+        
+        # Cheap literal checks skip patterns that cannot match: most chat
+        # messages have no digits, '@' or link characters at all. Every URL
+        # alternative needs a '/' except a bare "www." host.
+        has_digits = _DIGIT_PATTERN.search(text) is not None
+        # Lowercased once for the case-insensitive UPI and keyword scans
+        text_lower = text.lower()
         
         result = {
-            "bankAccounts": self.extract_bank_accounts(text),
-            "upiIds": self.extract_upi_ids(text),
-            "phoneNumbers": self.extract_phone_numbers(text),
-            "phishingLinks": self.extract_urls(text),
-            "suspiciousKeywords": self.extract_keywords(text),
+            "bankAccounts": self.extract_bank_accounts(text) if has_digits else [],
+            "upiIds": self.extract_upi_ids(text, text_lower) if "@" in text else [],
+            "phoneNumbers": self.extract_phone_numbers(text) if has_digits else [],
+            "phishingLinks": self.extract_urls(text) if "/" in text or "www." in text_lower else [],
+            "suspiciousKeywords": self.extract_keywords(text, text_lower),
         }
         
         # Log what we found
@@ -128,37 +193,46 @@ class IntelligenceExtractor:
         Returns:
             List of valid bank account numbers (duplicates removed)
         """
-        matches = self.patterns['bank_account'].findall(text)
-        validated = []
+        # Insertion-ordered dict as a set: duplicates are skipped before
+        # validation and order is kept, with no separate dedup pass
+        validated: Dict[str, None] = {}
         
-        for match in matches:
+        for match in self.patterns['bank_account'].finditer(text):
             # Clean the match (remove spaces and hyphens)
-            clean = match.replace(' ', '').replace('-', '')
-            if is_valid_bank_account(clean):
-                validated.append(clean)
+            clean = match.group(1).replace(' ', '').replace('-', '')
+            if clean not in validated and is_valid_bank_account(clean):
+                validated[clean] = None
+                if len(validated) >= self.MAX_ITEMS_PER_TYPE:
+                    break
         
-        # Remove duplicates while preserving order
-        return list(dict.fromkeys(validated))
+        return list(validated)
     
-    def extract_upi_ids(self, text: str) -> List[str]:
+    def extract_upi_ids(self, text: str, text_lower: Optional[str] = None) -> List[str]:
         """
         Extract valid UPI IDs from text.
         
         Args:
             text: Message text to analyze
+            text_lower: text.lower(), if the caller already has it
             
         Returns:
             List of valid UPI IDs (duplicates removed, lowercase)
         """
-        matches = self.patterns['upi_id'].findall(text)
-        validated = []
+        if text_lower is None:
+            text_lower = text.lower()
         
-        for match in matches:
-            upi_lower = match.lower()
-            if is_valid_upi_id(upi_lower):
-                validated.append(upi_lower)
+        # Matching the lowercased text yields lowercase IDs directly; the
+        # validator also checks the provider is a known UPI handle
+        validated: Dict[str, None] = {}
         
-        return list(dict.fromkeys(validated))
+        for match in self.patterns['upi_id'].finditer(text_lower):
+            upi_lower = match.group(1)
+            if upi_lower not in validated and is_valid_upi_id_lower(upi_lower):
+                validated[upi_lower] = None
+                if len(validated) >= self.MAX_ITEMS_PER_TYPE:
+                    break
+        
+        return list(validated)
     
     def extract_phone_numbers(self, text: str) -> List[str]:
         """
@@ -170,17 +244,17 @@ class IntelligenceExtractor:
         Returns:
             List of phone numbers in +91XXXXXXXXXX format (duplicates removed)
         """
-        # First try to find numbers with +91 prefix
-        full_pattern = re.compile(r'(\+91[\s\-]?[6-9]\d{9}|\b0?[6-9]\d{9})\b')
-        matches = full_pattern.findall(text)
-        validated = []
+        # Match numbers with or without the +91 prefix
+        validated: Dict[str, None] = {}
         
-        for match in matches:
-            clean = extract_clean_phone(match)
+        for match in self.patterns['phone_full'].finditer(text):
+            clean = extract_clean_phone(match.group(1))
             if clean:
-                validated.append(clean)
+                validated[clean] = None
+                if len(validated) >= self.MAX_ITEMS_PER_TYPE:
+                    break
         
-        return list(dict.fromkeys(validated))
+        return list(validated)
     
     def extract_urls(self, text: str) -> List[str]:
         """
@@ -192,35 +266,34 @@ class IntelligenceExtractor:
         Returns:
             List of valid URLs (duplicates removed)
         """
-        matches = self.patterns['url'].findall(text)
-        validated = []
+        validated: Dict[str, None] = {}
         
-        for match in matches:
+        for match in self.patterns['url'].finditer(text):
             # Clean trailing punctuation
-            clean = match.rstrip('.,;:!?)')
-            if is_valid_url(clean):
-                validated.append(clean)
+            clean = match.group(1).rstrip('.,;:!?)')
+            if clean not in validated and is_valid_url(clean):
+                validated[clean] = None
+                if len(validated) >= self.MAX_ITEMS_PER_TYPE:
+                    break
         
-        return list(dict.fromkeys(validated))
+        return list(validated)
     
-    def extract_keywords(self, text: str) -> List[str]:
+    def extract_keywords(self, text: str, text_lower: Optional[str] = None) -> List[str]:
         """
         Extract suspicious keywords from text.
         
         Args:
             text: Message text to analyze
+            text_lower: text.lower(), if the caller already has it
             
         Returns:
             List of suspicious keywords found (duplicates removed)
         """
-        text_lower = text.lower()
-        found = []
-        
-        for keyword in self.scam_keywords:
-            if keyword.lower() in text_lower:
-                found.append(keyword)
-        
-        return list(dict.fromkeys(found))
+        if text_lower is None:
+            text_lower = text.lower()
+        # str containment is a C substring search per keyword; for messages
+        # of chat length this beats a combined regex alternation
+        return [keyword for keyword_lower, keyword in self._keyword_matchers if keyword_lower in text_lower]
     
     def _empty_result(self) -> Dict[str, List[str]]:
         """Return an empty result structure."""
@@ -232,6 +305,11 @@ class IntelligenceExtractor:
             "suspiciousKeywords": [],
         }
     
+    def clear_cache(self) -> None:
+        """Forget all cached extraction results."""
+        with self._cache_lock:
+            self._cache.clear()
+    
     def get_intelligence_count(self, intelligence: Dict[str, List[str]]) -> int:
         """
         Count total intelligence items extracted.
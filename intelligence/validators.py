@@ -8,13 +8,37 @@ Provides validation for:
 - URLs/phishing links
 """
 
+import functools
 import re
 from typing import Optional
-import validators as url_validators
 
+# The validators library takes ~20ms to import; it is loaded on the first
+# URL check so callers that only validate numbers never pay for it
+_url_validators = None
+
+
+# Validators run once per regex candidate, so their patterns are compiled once
+# UPI username: at least 3 alphanumeric characters or ., -, _
+_UPI_USERNAME_PATTERN = re.compile(r'[\w.\-]{3,}')
+# Phone formatting characters stripped before validation
+_PHONE_FORMATTING_PATTERN = re.compile(r'[\s\-\(\)\+]')
+# Everything except digits and '+'
+_NON_PHONE_CHAR_PATTERN = re.compile(r'[^\d+]')
+# Cleaned phone number: optional +91, 91 or 0 prefix, then a 10-digit mobile
+_CLEAN_PHONE_PATTERN = re.compile(r'(?:\+91|91|0)?([6-9]\d{9})')
+# Bank account separators
+_ACCOUNT_SEPARATOR_PATTERN = re.compile(r'[\s\-]')
+
+# A number is sequential if it's a substring of a purely sequential run
+_ASCENDING_DIGITS = "12345678901234567890"
+_DESCENDING_DIGITS = "09876543210987654321"
+
+# Validated candidates remembered per validator; the same links and numbers
+# recur across a conversation's messages and across scam campaigns
+VALIDATION_CACHE_SIZE = 4096
 
 # Known UPI providers in India
-UPI_PROVIDERS = {
+UPI_PROVIDERS = frozenset({
     "paytm",
     "ybl",          # PhonePe
     "axisbank",
@@ -54,9 +78,10 @@ UPI_PROVIDERS = {
     "utbi",
     "vijb",
     "yesbankltd",
-}
+})
 
 
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
 def is_valid_bank_account(number: str) -> bool:
     """
     Validate an Indian bank account number.
@@ -73,25 +98,20 @@ def is_valid_bank_account(number: str) -> bool:
     Returns:
         bool: True if valid bank account format
     """
-    # Must be digits only
-    if not number.isdigit():
+    # Check length first, the cheapest reject (Indian bank accounts are 9-18 digits)
+    if len(number) < 9 or len(number) > 18:
         return False
     
-    # Check length (Indian bank accounts are 9-18 digits)
-    if len(number) < 9 or len(number) > 18:
+    # Must be digits only
+    if not number.isdigit():
         return False
     
     # Reject all same digits (e.g., 111111111)
     if len(set(number)) < 3:
         return False
     
-    # Reject purely sequential numbers (exact match only)
-    # A number is sequential if it's a substring of a purely sequential pattern
-    ascending = "12345678901234567890"
-    descending = "09876543210987654321"
-    
     # Only reject if the ENTIRE number is sequential
-    if number in ascending or number in descending:
+    if number in _ASCENDING_DIGITS or number in _DESCENDING_DIGITS:
         return False
     
     # Reject date-like patterns (DDMMYYYY)
@@ -122,30 +142,35 @@ def is_valid_upi_id(upi_id: str) -> bool:
     Returns:
         bool: True if valid UPI ID format
     """
-    if not upi_id or "@" not in upi_id:
+    if not upi_id:
         return False
+    return is_valid_upi_id_lower(upi_id.lower())
+
+
+def is_valid_upi_id_lower(upi_id: str) -> bool:
+    """
+    Validate a UPI ID that is already lowercase.
     
-    parts = upi_id.lower().split("@")
-    if len(parts) != 2:
-        return False
-    
-    username, provider = parts
-    
-    # Username validation: alphanumeric with ., -, _
-    if not username or len(username) < 3:
-        return False
+    Same rules as is_valid_upi_id, for callers that have lowercased the
+    candidate themselves.
     
-    username_pattern = r'^[\w.\-]+$'
-    if not re.match(username_pattern, username):
-        return False
+    Args:
+        upi_id: Lowercase UPI ID string
+        
+    Returns:
+        bool: True if valid UPI ID format
+    """
+    username, at, provider = upi_id.rpartition("@")
     
-    # Provider must be known
-    if provider not in UPI_PROVIDERS:
+    # Known provider first: the cheapest check and the most common reject
+    if not at or provider not in UPI_PROVIDERS:
         return False
     
-    return True
+    # A second '@' stays in the username and fails the charset check
+    return _UPI_USERNAME_PATTERN.fullmatch(username) is not None
 
 
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
 def is_valid_phone_number(phone: str) -> bool:
     """
     Validate an Indian phone number.
@@ -162,7 +187,7 @@ def is_valid_phone_number(phone: str) -> bool:
         bool: True if valid Indian phone number
     """
     # Clean the number
-    clean = re.sub(r'[\s\-\(\)\+]', '', phone)
+    clean = _PHONE_FORMATTING_PATTERN.sub('', phone)
     
     # Remove country code if present
     if clean.startswith('91') and len(clean) == 12:
@@ -187,6 +212,7 @@ def is_valid_phone_number(phone: str) -> bool:
     return True
 
 
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
 def is_valid_url(url: str) -> bool:
     """
     Validate a URL/phishing link.
@@ -216,8 +242,12 @@ def is_valid_url(url: str) -> bool:
             test_url = 'http://' + test_url
     
     # Use validators library
+    global _url_validators
+    if _url_validators is None:
+        import validators as _url_validators
+    
     try:
-        result = url_validators.url(test_url)
+        result = _url_validators.url(test_url)
         return result is True
     except Exception:
         return False
@@ -233,12 +263,13 @@ def extract_clean_bank_account(raw: str) -> Optional[str]:
     Returns:
         Cleaned bank account number if valid, None otherwise
     """
-    clean = re.sub(r'[\s\-]', '', raw)
+    clean = _ACCOUNT_SEPARATOR_PATTERN.sub('', raw)
     if is_valid_bank_account(clean):
         return clean
     return None
 
 
+@functools.lru_cache(maxsize=VALIDATION_CACHE_SIZE)
 def extract_clean_phone(raw: str) -> Optional[str]:
     """
     Clean a raw phone number and return in standard format.
@@ -250,20 +281,11 @@ def extract_clean_phone(raw: str) -> Optional[str]:
         Phone number in +91XXXXXXXXXX format if valid, None otherwise
     """
     # Remove all non-digit characters except +
-    clean = re.sub(r'[^\d+]', '', raw)
-    
-    # Normalize to 10-digit format first
-    if clean.startswith('+91'):
-        digits = clean[3:]
-    elif clean.startswith('91') and len(clean) == 12:
-        digits = clean[2:]
-    elif clean.startswith('0') and len(clean) == 11:
-        digits = clean[1:]
-    else:
-        digits = clean
+    clean = _NON_PHONE_CHAR_PATTERN.sub('', raw)
     
-    # Validate
-    if len(digits) == 10 and digits[0] in '6789' and digits.isdigit():
-        return f"+91{digits}"
+    # One full match both strips the prefix and validates the digits
+    match = _CLEAN_PHONE_PATTERN.fullmatch(clean)
+    if match:
+        return f"+91{match.group(1)}"
     
     return None
@@ -0,0 +1,31 @@
+"""
+Shared pytest fixtures.
+"""
+
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Set test API key before anything imports config
+os.environ["API_SECRET_KEY"] = "test-api-key"
+os.environ["GUVI_CALLBACK_ENABLED"] = "false"
+
+
+@pytest.fixture(scope="session")
+def client():
+    """
+    API test client shared by the whole test session.
+    
+    The app is imported on first use, so test modules that never call the
+    API do not build it, and the lifespan runs once rather than per test.
+    """
+    from fastapi.testclient import TestClient
+    
+    from api.main import app
+    
+    with TestClient(app) as test_client:
+        yield test_client
@@ -23,12 +23,15 @@ Usage:
 import sys
 import os
 import json
+import asyncio
 
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from dotenv import load_dotenv
-load_dotenv()
+
+def _load_env() -> None:
+    """Load the project .env into os.environ, via config, the first time it is needed."""
+    import config  # noqa: F401
 
 
 def test_extractors():
@@ -37,9 +40,7 @@ def test_extractors():
     print("TEST: Intelligence Extraction")
     print("=" * 60)
     
-    from intelligence.extractors import IntelligenceExtractor
-    
-    extractor = IntelligenceExtractor()
+    from intelligence.extractors import extractor
     
     test_messages = [
         "URGENT: Your account is blocked! Pay to fraud@paytm or call +919876543210",
@@ -67,6 +68,7 @@ def test_detector():
     print("TEST: Detector Agent")
     print("=" * 60)
     
+    _load_env()
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         print("❌ GEMINI_API_KEY not set. Skipping detector test.")
@@ -84,7 +86,7 @@ def test_detector():
     for expected, msg in test_messages:
         print(f"\n--- Expected: {expected} ---")
         print(f"Input: {msg[:50]}...")
-        result = detector.detect_scam(msg)
+        result = asyncio.run(detector.detect_scam(msg))
         print(f"Is Scam: {result['is_scam']}")
         print(f"Confidence: {result['confidence']:.2f}")
         print(f"Reason: {result['reason'][:80]}...")
@@ -99,6 +101,7 @@ def test_actor():
     print("TEST: Actor Agent")
     print("=" * 60)
     
+    _load_env()
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         print("❌ GEMINI_API_KEY not set. Skipping actor test.")
@@ -114,11 +117,11 @@ def test_actor():
     
     for persona in personas:
         print(f"\n--- Persona: {persona} ---")
-        response = actor.generate_response(
+        response = asyncio.run(actor.generate_response(
             message=scammer_message,
             persona=persona,
             history=[]
-        )
+        ))
         print(f"Scammer: {scammer_message[:50]}...")
         print(f"Agent ({persona}): {response}")
     
@@ -131,6 +134,7 @@ def test_orchestrator():
     print("TEST: Full Orchestrator Flow")
     print("=" * 60)
     
+    _load_env()
     api_key = os.environ.get("GEMINI_API_KEY")
     if not api_key:
         print("❌ GEMINI_API_KEY not set. Skipping orchestrator test.")
@@ -165,12 +169,12 @@ def test_orchestrator():
             "timestamp": f"2026-01-31T10:{i:02d}:00Z"
         }
         
-        result = orchestrator.process_message(
+        result = asyncio.run(orchestrator.process_message(
             session_id=session_id,
             message=message,
             history=history,
             metadata={"channel": "sms", "language": "en"}
-        )
+        ))
         
         print(f"Scam Detected: {result['scamDetected']}")
         print(f"Agent Response: {result['agentResponse']}")
@@ -207,6 +211,7 @@ def test_api():
     import requests
     
     base_url = "http://localhost:8000"
+    _load_env()
     api_key = os.environ.get("API_SECRET_KEY", "default-dev-key-change-in-production")
     
     # Test health endpoint
@@ -2,18 +2,83 @@
 Tests for agent functionality.
 
 Tests SessionManager and InvestigatorAgent.
-DetectorAgent and ActorAgent require API keys and are tested separately.
+DetectorAgent and ActorAgent require API keys for live calls and are tested
+separately; here they run against a fake Gemini model.
 """
 
+import asyncio
 import pytest
-import sys
-import os
-
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from concurrent.futures import ThreadPoolExecutor
 
 from agents.session_manager import SessionManager
 from agents.investigator_agent import InvestigatorAgent
+from agents.detector_agent import DetectorAgent
+from agents.actor_agent import ActorAgent
+from agents.rate_limiter import GeminiLimiter, backoff_delay, is_retryable
+from agents.result_store import ResultStore
+from agents.orchestrator import create_orchestrator
+from agents.detection_batcher import DetectionBatcher
+from google.api_core import exceptions as google_exceptions
+
+
+class FakeResponse:
+    """Minimal stand-in for a Gemini response."""
+    
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeStream:
+    """Async iterator over response chunks that records how many were read."""
+    
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.consumed = 0
+        self.closed = False
+    
+    def __aiter__(self):
+        return self
+    
+    async def __anext__(self):
+        if self.consumed >= len(self.chunks):
+            raise StopAsyncIteration
+        self.consumed += 1
+        return FakeResponse(self.chunks[self.consumed - 1])
+    
+    async def aclose(self):
+        self.closed = True
+
+
+class FakeModel:
+    """Fake Gemini model that records prompts and returns canned text."""
+    
+    def __init__(self, text, chunk_size=16):
+        self.text = text
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.last_stream = None
+    
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        if stream:
+            self.last_stream = FakeStream(
+                self.text[i:i + self.chunk_size]
+                for i in range(0, len(self.text), self.chunk_size)
+            )
+            return self.last_stream
+        return FakeResponse(self.text)
+
+
+class FailingModel:
+    """Fake Gemini model that always raises the given error."""
+    
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+    
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        raise self.error
 
 
 class TestSessionManager:
@@ -37,6 +102,15 @@ class TestSessionManager:
         assert session["scam_detected"] is False
         assert session["conversation_active"] is True
     
+    def test_session_view_is_live_and_read_only(self, session_manager):
+        """Test the returned session reflects updates and rejects writes."""
+        session = session_manager.get_or_create_session("test-123")
+        session_manager.increment_turn("test-123")
+        
+        assert session["turn_count"] == 1
+        with pytest.raises(TypeError):
+            session["turn_count"] = 5
+    
     def test_get_existing_session(self, session_manager):
         """Test retrieving existing session."""
         session_manager.get_or_create_session("test-123")
@@ -104,6 +178,84 @@ class TestSessionManager:
         assert len(intel["bankAccounts"]) == 1
         assert len(intel["upiIds"]) == 2
         assert len(intel["phoneNumbers"]) == 1
+        
+        # Running total matches the stored items
+        assert session["total_intelligence_items"] == sum(len(v) for v in intel.values())
+    
+    def test_concurrent_turns_are_counted(self, session_manager):
+        """Test per-session locks keep counts exact across threads."""
+        session_manager.get_or_create_session("test-123")
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda _: session_manager.increment_turn("test-123"), range(200)))
+        
+        assert session_manager.get_or_create_session("test-123")["turn_count"] == 200
+        assert "_lock" not in session_manager.get_all_sessions()["test-123"]
+    
+    def test_get_all_sessions_returns_intelligence_lists(self, session_manager):
+        """Test the admin view copies intelligence out as plain lists."""
+        session_manager.get_or_create_session("test-123")
+        session_manager.update_intelligence("test-123", {"upiIds": ["a@ybl", "b@ybl"]})
+        
+        intelligence = session_manager.get_all_sessions()["test-123"]["intelligence"]
+        assert intelligence["upiIds"] == ["a@ybl", "b@ybl"]
+        assert intelligence["bankAccounts"] == []
+        
+        intelligence["upiIds"].append("c@ybl")
+        assert session_manager.get_session_summary("test-123")["extractedIntelligence"]["upiIds"] == ["a@ybl", "b@ybl"]
+    
+    def test_cleanup_old_sessions_across_shards(self, session_manager):
+        """Test cleanup removes only expired sessions from every shard."""
+        for i in range(40):
+            session_manager.get_or_create_session(f"s{i}")
+        for i in range(0, 40, 2):
+            session_manager._get(f"s{i}")["_created_ts"] -= 7200
+        
+        assert session_manager.cleanup_old_sessions(max_age_hours=1) == 20
+        assert sorted(session_manager.get_all_sessions()) == sorted(f"s{i}" for i in range(1, 40, 2))
+    
+    def test_ended_session_stays_ended(self, session_manager):
+        """Test ended sessions short-circuit and keep their end reason."""
+        session_manager.get_or_create_session("test-123")
+        session_manager.end_session("test-123", "max_turns_reached")
+        
+        should_end, reason = session_manager.should_end_conversation("test-123")
+        session_manager.end_session("test-123", reason)
+        
+        assert (should_end, reason) == (True, "max_turns_reached")
+        assert session_manager.get_or_create_session("test-123")["end_reason"] == "max_turns_reached"
+    
+    def test_lock_for_is_stable_per_session(self, session_manager):
+        """Test a session always maps to the same turn lock, and only it does."""
+        assert session_manager.lock_for("abc") is session_manager.lock_for("abc")
+        assert session_manager.lock_for("abc") is not session_manager.lock_for("xyz")
+    
+    def test_intelligence_keeps_first_seen_order(self, session_manager):
+        """Test accumulated intelligence is reported in the order it was found."""
+        session_manager.get_or_create_session("test-123")
+        session_manager.update_intelligence("test-123", {"upiIds": ["b@ybl", "a@ybl"]})
+        session_manager.update_intelligence("test-123", {"upiIds": ["a@ybl", "c@ybl"]})
+        
+        summary = session_manager.get_session_summary("test-123")
+        assert summary["extractedIntelligence"]["upiIds"] == ["b@ybl", "a@ybl", "c@ybl"]
+    
+    def test_intelligence_counters_track_updates(self, session_manager):
+        """Test the incremental type and high-value counters match the data."""
+        session_manager.get_or_create_session("test-123")
+        session_manager.update_intelligence("test-123", {"upiIds": ["a@ybl"], "suspiciousKeywords": ["urgent"]})
+        session_manager.update_intelligence("test-123", {"upiIds": ["a@ybl", "b@ybl"]})
+        
+        session = session_manager.get_or_create_session("test-123")
+        assert session["_counters"][2] == 2
+        assert session_manager.get_session_summary("test-123")["highValueIntelCount"] == 2
+    
+    def test_add_processing_time_accumulates(self, session_manager):
+        """Test per-turn processing times add up in the session."""
+        session_manager.get_or_create_session("test-123")
+        session_manager.add_processing_time("test-123", 1_500_000)
+        session_manager.add_processing_time("test-123", 2_000_000)
+        
+        session = session_manager.get_or_create_session("test-123")
+        assert session["total_processing_ns"] == 3_500_000
     
     def test_should_end_max_turns(self, session_manager):
         """Test conversation ends at max turns."""
@@ -243,6 +395,48 @@ class TestInvestigatorAgent:
         assert "scammer@paytm" in result["upiIds"]
         assert "+919876543210" in result["phoneNumbers"]
     
+    def test_extract_from_messages_keeps_messages_apart(self, investigator):
+        """Test digits at a message boundary do not swallow the next message."""
+        messages = [
+            ("scammer", "Ref 4820"),
+            ("agent", "Which account?"),
+            ("scammer", "7391 5063 2211 send money"),
+        ]
+        
+        result = investigator.extract_from_messages(messages)
+        
+        assert result["bankAccounts"] == ["739150632211"]
+        assert "send money" in result["suspiciousKeywords"]
+    
+    def test_extract_from_messages_scans_only_new_messages(self, monkeypatch):
+        """Test earlier turns are served from the extractor's cache."""
+        from intelligence.extractors import IntelligenceExtractor
+        
+        extractor = IntelligenceExtractor()
+        investigator = InvestigatorAgent(extractor)
+        scanned = []
+        original = extractor._extract_uncached
+        monkeypatch.setattr(extractor, "_extract_uncached", lambda text: scanned.append(text) or original(text))
+        
+        messages = [("scammer", "Pay to fraud@ybl"), ("agent", "Which UPI?")]
+        investigator.extract_from_messages(messages)
+        messages.append(("scammer", "Or call 9876543210"))
+        result = investigator.extract_from_messages(messages)
+        
+        assert scanned == ["Pay to fraud@ybl", "Or call 9876543210"]
+        assert result["upiIds"] == ["fraud@ybl"]
+        assert result["phoneNumbers"] == ["+919876543210"]
+    
+    def test_extract_many_matches_extract_all(self, investigator):
+        """Test bulk extraction returns per-text results in order."""
+        texts = [f"Pay to user{i}@paytm or call 98765432{i:02d}" for i in range(40)]
+        
+        results = investigator.extract_many(texts)
+        
+        assert len(results) == 40
+        assert results == [investigator.extractor.extract_all(t) for t in texts]
+        assert results[7]["upiIds"] == ["user7@paytm"]
+    
     def test_merge_intelligence(self, investigator):
         """Test merging intelligence without duplicates."""
         existing = {
@@ -267,6 +461,9 @@ class TestInvestigatorAgent:
         assert len(result["upiIds"]) == 2
         assert len(result["phoneNumbers"]) == 1
         assert len(result["suspiciousKeywords"]) == 2
+        # Existing items keep their place ahead of new ones
+        assert result["bankAccounts"] == ["123", "456"]
+        assert result["suspiciousKeywords"] == ["urgent", "verify"]
     
     def test_get_total_count(self, investigator):
         """Test total item counting."""
@@ -304,48 +501,562 @@ class TestInvestigatorAgent:
         
         assert investigator.get_high_value_count(intel) == 5
     
-    def test_analyze_threat_level(self, investigator):
-        """Test threat level analysis."""
+    @pytest.mark.parametrize("intel,expected", [
         # Critical: 3+ high value items
-        intel_critical = {
-            "bankAccounts": ["a"],
-            "upiIds": ["b"],
-            "phoneNumbers": ["c"],
-            "phishingLinks": [],
-            "suspiciousKeywords": []
-        }
-        assert investigator.analyze_threat_level(intel_critical) == "critical"
-        
+        ({"bankAccounts": ["a"], "upiIds": ["b"], "phoneNumbers": ["c"],
+          "phishingLinks": [], "suspiciousKeywords": []}, "critical"),
         # High: 2 high value items
-        intel_high = {
-            "bankAccounts": [],
-            "upiIds": ["a"],
-            "phoneNumbers": ["b"],
-            "phishingLinks": [],
-            "suspiciousKeywords": []
-        }
-        assert investigator.analyze_threat_level(intel_high) == "high"
-        
+        ({"bankAccounts": [], "upiIds": ["a"], "phoneNumbers": ["b"],
+          "phishingLinks": [], "suspiciousKeywords": []}, "high"),
         # Medium: 1 high value item
-        intel_medium = {
-            "bankAccounts": [],
-            "upiIds": ["a"],
-            "phoneNumbers": [],
-            "phishingLinks": [],
-            "suspiciousKeywords": ["urgent"]
-        }
-        assert investigator.analyze_threat_level(intel_medium) == "medium"
-        
+        ({"bankAccounts": [], "upiIds": ["a"], "phoneNumbers": [],
+          "phishingLinks": [], "suspiciousKeywords": ["urgent"]}, "medium"),
         # Low: no high value items
-        intel_low = {
-            "bankAccounts": [],
-            "upiIds": [],
-            "phoneNumbers": [],
-            "phishingLinks": [],
-            "suspiciousKeywords": ["urgent"]
-        }
-        assert investigator.analyze_threat_level(intel_low) == "low"
+        ({"bankAccounts": [], "upiIds": [], "phoneNumbers": [],
+          "phishingLinks": [], "suspiciousKeywords": ["urgent"]}, "low"),
+    ], ids=["critical", "high", "medium", "low"])
+    def test_analyze_threat_level(self, investigator, intel, expected):
+        """Test threat level analysis."""
+        assert investigator.analyze_threat_level(intel) == expected
+
+
+class TestDetectorAgent:
+    """Test DetectorAgent against a fake Gemini model."""
+    
+    @pytest.fixture
+    def detector(self):
+        """Create detector agent with a fake model."""
+        agent = DetectorAgent(api_key="test-key")
+        agent.model = FakeModel(
+            '```json\n{"is_scam": true, "confidence": 0.92, '
+            '"reason": "Asks for OTP", "indicators": ["otp"]}\n```'
+        )
+        agent.retry_delay = 0
+        return agent
+    
+    def test_detect_scam_is_async(self, detector):
+        """Test detection awaits the async Gemini call."""
+        result = asyncio.run(detector.detect_scam("Share the code you received"))
+        
+        assert result["is_scam"] is True
+        assert result["confidence"] == 0.92
+        assert detector.model.calls == 1
+    
+    def test_detect_scam_stops_streaming_after_json(self, detector):
+        """Test the stream is abandoned once the JSON object is complete."""
+        detector.model = FakeModel(
+            '{"is_scam": false, "confidence": 0.1, "reason": "a {brace} in text", '
+            '"indicators": []}' + " trailing commentary" * 10
+        )
+        result = asyncio.run(detector.detect_scam("See you at lunch"))
+        stream = detector.model.last_stream
+        
+        assert result["is_scam"] is False
+        assert result["reason"] == "a {brace} in text"
+        assert stream.consumed < len(stream.chunks)
+        assert stream.closed
+    
+    def test_detect_scam_scans_json_across_chunk_boundaries(self, detector):
+        """Test string state carries over when every chunk is one character."""
+        detector.model = FakeModel(
+            '{"is_scam": false, "confidence": 0.1, "reason": "a \\"}\\" quote", '
+            '"indicators": []}' + " trailing", chunk_size=1
+        )
+        result = asyncio.run(detector.detect_scam("See you at lunch"))
+        stream = detector.model.last_stream
+        
+        assert result["reason"] == 'a "}" quote'
+        assert stream.consumed < len(stream.chunks)
+    
+    def test_strip_code_block_without_json_is_unchanged(self, detector):
+        """Test an unclosed fence with no object is not cut to its last character."""
+        assert detector._strip_code_block("```json\nnot available") == "```json\nnot available"
+        assert detector._strip_code_block('```json\n{"is_scam": true') == '{"is_scam": true'
+    
+    def test_detect_scam_skips_gemini_on_strong_indicator(self, detector):
+        """Test strong indicators are classified without a Gemini call."""
+        result = asyncio.run(detector.detect_scam("Your account blocked, SEND OTP now"))
+        
+        assert result["is_scam"] is True
+        assert result["confidence"] == 0.95
+        assert result["indicators"] == ["account blocked"]
+        assert detector.model.calls == 0
+        assert detector.quick_detections == 1
+    
+    def test_detect_scam_force_calls_gemini(self, detector):
+        """Test force=True bypasses the quick classification."""
+        result = asyncio.run(detector.detect_scam("Please send OTP", force=True))
+        
+        assert result["confidence"] == 0.92
+        assert detector.model.calls == 1
+    
+    def test_detect_scam_caches_repeat_messages(self, detector):
+        """Test identical message and context reuse the earlier verdict."""
+        asyncio.run(detector.detect_scam("Share the code you received"))
+        result = asyncio.run(detector.detect_scam("Share the code you received"))
+        
+        assert result["confidence"] == 0.92
+        assert detector.model.calls == 1
+        
+        history = [{"sender": "scammer", "text": "Hello"}]
+        asyncio.run(detector.detect_scam("Share the code you received", history))
+        assert detector.model.calls == 2
+    
+    def test_detect_scam_reuses_stored_results(self, detector, tmp_path):
+        """Test verdicts persisted in the result store survive a restart."""
+        path = str(tmp_path / "detections.db")
+        detector.result_store = ResultStore(path)
+        asyncio.run(detector.detect_scam("Share the code you received"))
+        detector.result_store.close()
+        
+        restarted = DetectorAgent(api_key="test-key", result_store=ResultStore(path))
+        restarted.model = FakeModel("not json")
+        result = asyncio.run(restarted.detect_scam("Share the code you received"))
+        
+        assert result["confidence"] == 0.92
+        assert restarted.model.calls == 0
+        restarted.close()
+    
+    def test_orchestrator_close_closes_result_store(self, tmp_path):
+        """Test shutdown closes the detection result store."""
+        import sqlite3
+        
+        orch = create_orchestrator(
+            api_key="test-key", gemini_rpm=0, detection_store_path=str(tmp_path / "detections.db")
+        )
+        orch.close()
+        
+        with pytest.raises(sqlite3.ProgrammingError):
+            orch.detector.result_store.get(b"key")
+    
+    def test_detect_scam_falls_back_on_bad_json(self, detector):
+        """Test default response after all retries fail to parse."""
+        detector.model = FakeModel("not json")
+        result = asyncio.run(detector.detect_scam("Hello there"))
+        
+        assert result["indicators"] == ["detection_fallback"]
+        assert detector.model.calls == detector.max_retries + 1
+    
+    def test_detect_scam_fails_fast_on_invalid_argument(self, detector):
+        """Test non-transient API errors are not retried."""
+        detector.model = FailingModel(google_exceptions.InvalidArgument("bad key"))
+        result = asyncio.run(detector.detect_scam("Hello there"))
+        
+        assert result["indicators"] == ["detection_fallback"]
+        assert detector.model.calls == 1
+    
+    def test_detect_scam_retries_on_quota_errors(self, detector):
+        """Test quota errors are retried up to max_retries."""
+        detector.model = FailingModel(google_exceptions.ResourceExhausted("quota"))
+        asyncio.run(detector.detect_scam("Hello there"))
+        
+        assert detector.model.calls == detector.max_retries + 1
+    
+    def test_agents_share_model_instances(self):
+        """Test agents with the same settings reuse one Gemini model."""
+        first = DetectorAgent(api_key="test-key")
+        second = DetectorAgent(api_key="test-key")
+        
+        assert first.model is second.model
+    
+    def test_detect_scam_batch(self, detector):
+        """Test batch detection returns one result per message in order."""
+        messages = ["Share the code", "Pay the fee", "Verify your card"]
+        results = asyncio.run(detector.detect_scam_batch(messages, max_concurrency=2))
+        
+        assert len(results) == 3
+        assert all(r["is_scam"] for r in results)
+        assert detector.model.calls == 3
+    
+    def test_quick_classification(self, detector):
+        """Test keyword-based quick screening."""
+        assert detector.get_quick_classification("Please SEND OTP now") is True
+        assert detector.get_quick_classification("There is an Arrest Warrant") is True
+        assert detector.get_quick_classification("See you at lunch") is False
+        assert detector.get_quick_classification("") is False
+
+
+class TestDetectionBatcher:
+    """Test combining concurrent detections into one Gemini call."""
+    
+    @pytest.fixture
+    def batcher(self):
+        """Create a batcher around a detector with fake models."""
+        detector = DetectorAgent(api_key="test-key")
+        detector.model = FakeModel('{"is_scam": false, "confidence": 0.2}')
+        detector.batch_model = FakeModel(
+            '```json\n[{"is_scam": true, "confidence": 0.8, "indicators": ["fee"]}, '
+            '{"is_scam": false, "confidence": 0.1}, '
+            '{"is_scam": true, "confidence": 0.7}]\n```'
+        )
+        detector.retry_delay = 0
+        return DetectionBatcher(detector, max_batch=3, max_wait_ms=50)
+    
+    def run_concurrently(self, batcher, messages):
+        """Submit messages at the same time and collect results."""
+        async def submit_all():
+            return await asyncio.gather(*(batcher.detect_scam(m) for m in messages))
+        return asyncio.run(submit_all())
+    
+    def test_concurrent_messages_share_one_call(self, batcher):
+        """Test a full batch is sent as one request with results in order."""
+        results = self.run_concurrently(batcher, ["Pay the fee", "Hi mom", "Verify now"])
+        
+        assert [r["is_scam"] for r in results] == [True, False, True]
+        assert results[0]["indicators"] == ["fee"]
+        assert batcher.detector.batch_model.calls == 1
+        assert batcher.detector.model.calls == 0
+    
+    def test_partial_batch_flushes_after_wait(self, batcher):
+        """Test a lone message is sent after the wait window."""
+        results = self.run_concurrently(batcher, ["Hi mom"])
+        
+        assert results[0]["confidence"] == 0.2
+        assert batcher.detector.model.calls == 1
+    
+    def test_wrong_verdict_count_falls_back(self, batcher):
+        """Test a mismatched combined response falls back to single calls."""
+        results = self.run_concurrently(batcher, ["Pay the fee", "Hi mom"])
+        
+        assert [r["confidence"] for r in results] == [0.2, 0.2]
+        assert batcher.detector.batch_model.calls == 1
+        assert batcher.detector.model.calls == 2
+    
+    def test_strong_indicator_skips_batch(self, batcher):
+        """Test locally classified messages never wait for a batch."""
+        results = self.run_concurrently(batcher, ["Please send OTP"])
+        
+        assert results[0]["confidence"] == 0.95
+        assert batcher.detector.batch_model.calls == 0
+    
+    def test_batch_holds_one_semaphore_slot(self, batcher):
+        """Test a whole batch runs under a single slot of the shared limit."""
+        batcher.semaphore = asyncio.Semaphore(1)
+        results = self.run_concurrently(batcher, ["Pay the fee", "Hi mom", "Verify now"])
+        
+        assert [r["is_scam"] for r in results] == [True, False, True]
+        assert batcher.detector.batch_model.calls == 1
+    
+    def test_cancelled_waiters_are_dropped(self, batcher):
+        """Test callers that gave up before the flush are not classified."""
+        async def submit_and_cancel():
+            kept = asyncio.create_task(batcher.detect_scam("Hi mom"))
+            dropped = asyncio.create_task(batcher.detect_scam("Pay the fee"))
+            await asyncio.sleep(0)
+            dropped.cancel()
+            return await kept
+        
+        result = asyncio.run(submit_and_cancel())
+        
+        assert result["confidence"] == 0.2
+        assert batcher.detector.batch_model.calls == 0
+        assert batcher.detector.model.calls == 1
+
+
+class TestActorAgent:
+    """Test ActorAgent against a fake Gemini model."""
+    
+    @pytest.fixture
+    def actor(self):
+        """Create actor agent with a fake model."""
+        agent = ActorAgent(api_key="test-key")
+        agent.model = FakeModel("Oh my, what should I do?")
+        agent.persona_models = {p: agent.model for p in agent.persona_models}
+        agent.retry_delay = 0
+        return agent
+    
+    def test_opening_reply_is_cached(self, actor):
+        """Test repeated scam templates reuse the cached reply."""
+        first = asyncio.run(actor.generate_response(
+            "Send Rs.500 to 9876543210 now!", "elderly"
+        ))
+        second = asyncio.run(actor.generate_response(
+            "send rs.999 to 9123456780 now!", "elderly"
+        ))
+        
+        assert first and second
+        assert actor.model.calls == 1
+    
+    def test_cache_is_per_persona(self, actor):
+        """Test different personas do not share cached replies."""
+        asyncio.run(actor.generate_response("Your KYC expired", "elderly"))
+        asyncio.run(actor.generate_response("Your KYC expired", "novice"))
+        
+        assert actor.model.calls == 2
+    
+    def test_replies_with_history_are_not_cached(self, actor):
+        """Test mid-conversation replies always call the model."""
+        history = [{"sender": "scammer", "text": "Hello"}]
+        asyncio.run(actor.generate_response("Pay now", "elderly", history))
+        asyncio.run(actor.generate_response("Pay now", "elderly", history))
+        
+        assert actor.model.calls == 2
+    
+    def test_select_persona_priority(self, actor):
+        """Test scam type routing keeps its priority order."""
+        # Lottery outranks banking even when banking keywords come first
+        assert actor.select_persona(["Fake bank account", "lottery prize"]) == "elderly"
+        assert actor.select_persona(["Impersonating bank"]) == "professional"
+        assert actor.select_persona(["Asks for OTP"]) == "novice"
+        assert actor.select_persona(["Urgency"]) == "elderly"
+        assert actor.select_persona([]) == "elderly"
+    
+    def test_clean_response(self, actor):
+        """Test quote/label stripping and trimming at a sentence boundary."""
+        assert actor._clean_response('"Reply: who is this?"') == "who is this?"
+        
+        long_text = "First sentence here. " * 8 + "x" * 60
+        cleaned = actor._clean_response(long_text)
+        assert cleaned.endswith("here.")
+        assert len(cleaned) <= 180
+        
+        assert actor._clean_response("y" * 250) == "y" * 180 + "..."
+    
+    def test_humanize_response_replaces_one_whole_word(self):
+        """Test at most one typo, only on whole words, keeping capitalization."""
+        from agents.prompts import COMMON_TYPOS, humanize_response
+        
+        text = "Please  tell me, is the bank open?"
+        assert humanize_response(text, typo_probability=0.0) == text
+        
+        result = humanize_response(text, typo_probability=1.0)
+        assert result.split("  ")[0] in {t.capitalize() for t in COMMON_TYPOS["please"]}
+        assert result.endswith("  tell me, is the bank open?")
+    
+    def test_persona_models_use_system_instruction(self):
+        """Test each persona gets its own model."""
+        agent = ActorAgent(api_key="test-key")
+        
+        assert set(agent.persona_models) == {"elderly", "professional", "novice"}
+
+
+class TestOrchestrator:
+    """Test the full pipeline against fake Gemini models."""
+    
+    @pytest.fixture
+    def orchestrator(self):
+        """Create an orchestrator whose agents use fake models."""
+        orch = create_orchestrator(api_key="test-key", gemini_rpm=0)
+        orch.detector.model = FakeModel(
+            '{"is_scam": true, "confidence": 0.9, "reason": "Payment request", '
+            '"indicators": ["bank transfer"]}'
+        )
+        orch.actor.model = FakeModel("Which bank is this?")
+        orch.actor.persona_models = {p: orch.actor.model for p in orch.actor.persona_models}
+        return orch
+    
+    def test_first_turn_detects_and_extracts(self, orchestrator):
+        """Test detection and extraction both feed the first response."""
+        message = {"sender": "scammer", "text": "Pay to fraud@ybl today"}
+        result = asyncio.run(orchestrator.process_message("s1", message, [], {}))
+        
+        assert result["scamDetected"] is True
+        assert result["extractedIntelligence"]["upiIds"] == ["fraud@ybl"]
+        assert result["agentResponse"]
+        assert orchestrator.detector.model.calls == 1
+    
+    def test_confirmed_scam_skips_detection(self, orchestrator):
+        """Test later turns only extract once the scam is confirmed."""
+        message = {"sender": "scammer", "text": "Pay to fraud@ybl today"}
+        asyncio.run(orchestrator.process_message("s1", message, [], {}))
+        
+        followup = {"sender": "scammer", "text": "Or call 9876543210"}
+        result = asyncio.run(orchestrator.process_message("s1", followup, [], {}))
+        
+        assert orchestrator.detector.model.calls == 1
+        assert result["extractedIntelligence"]["phoneNumbers"] == ["+919876543210"]
+        assert result["extractedIntelligence"]["upiIds"] == ["fraud@ybl"]
+    
+    def test_same_session_turns_are_serialized(self, orchestrator):
+        """Test concurrent messages for one session run one turn at a time."""
+        message = {"sender": "scammer", "text": "Pay to fraud@ybl today"}
+        
+        async def send_twice():
+            return await asyncio.gather(
+                orchestrator.process_message("s1", message, [], {}),
+                orchestrator.process_message("s1", message, [], {}),
+            )
+        
+        results = asyncio.run(send_twice())
+        turns = sorted(r["engagementMetrics"]["conversationTurn"] for r in results)
+        
+        assert turns == [1, 2]
+        assert orchestrator.detector.model.calls == 1
+    
+    def test_other_sessions_do_not_wait_on_a_slow_turn(self, orchestrator):
+        """Test a session's slow Gemini call does not block another session."""
+        
+        class GatedModel(FakeModel):
+            """Holds calls whose prompt mentions "hold" until released."""
+            
+            release = None
+            
+            async def generate_content_async(self, prompt, stream=False):
+                if "hold" in prompt:
+                    await self.release.wait()
+                return await super().generate_content_async(prompt, stream)
+        
+        orchestrator.detector.model = GatedModel(orchestrator.detector.model.text)
+        
+        async def run():
+            orchestrator.detector.model.release = asyncio.Event()
+            slow = asyncio.create_task(orchestrator.process_message(
+                "slow", {"sender": "scammer", "text": "Please hold and pay fraud@ybl"}, [], {}
+            ))
+            await asyncio.sleep(0)
+            fast = await asyncio.wait_for(orchestrator.process_message(
+                "fast", {"sender": "scammer", "text": "Pay to other@ybl today"}, [], {}
+            ), timeout=5)
+            still_waiting = not slow.done()
+            orchestrator.detector.model.release.set()
+            return fast, await slow, still_waiting
+        
+        fast, slow, still_waiting = asyncio.run(run())
+        
+        assert still_waiting
+        assert fast["extractedIntelligence"]["upiIds"] == ["other@ybl"]
+        assert slow["extractedIntelligence"]["upiIds"] == ["fraud@ybl"]
+    
+    def test_first_reply_is_speculated_alongside_detection(self, orchestrator):
+        """Test the speculative first reply is reused when the persona matches."""
+        orchestrator.speculative_response = True
+        message = {"sender": "scammer", "text": "Complete the bank transfer now"}
+        result = asyncio.run(orchestrator.process_message("s1", message, [], {}))
+        
+        assert result["agentResponse"]
+        assert orchestrator.actor.model.calls == 1
+    
+    def test_speculative_reply_discarded_for_non_scam(self, orchestrator):
+        """Test a negative verdict cancels the in-flight speculative reply."""
+        
+        class StuckModel(FakeModel):
+            """Never answers; records whether the call was cancelled."""
+            
+            cancelled = False
+            
+            async def generate_content_async(self, prompt, stream=False):
+                self.calls += 1
+                try:
+                    await asyncio.Event().wait()
+                except asyncio.CancelledError:
+                    self.cancelled = True
+                    raise
+        
+        orchestrator.speculative_response = True
+        orchestrator.actor.model = StuckModel("")
+        orchestrator.actor.persona_models = {p: orchestrator.actor.model for p in orchestrator.actor.persona_models}
+        orchestrator.detector.model = FakeModel(
+            '{"is_scam": false, "confidence": 0.1, "reason": "Greeting", "indicators": []}'
+        )
+        message = {"sender": "scammer", "text": "See you at dinner"}
+        result = asyncio.run(orchestrator.process_message("s1", message, [], {}))
+        
+        assert result["scamDetected"] is False
+        assert result["agentResponse"] == ""
+        assert orchestrator.actor.model.calls == 1
+        assert orchestrator.actor.model.cancelled
+    
+    def test_speculation_is_off_by_default(self, orchestrator):
+        """Test the first reply waits for detection unless speculation is enabled."""
+        orchestrator.detector.model = FakeModel(
+            '{"is_scam": false, "confidence": 0.9, "reason": "Greeting", "indicators": []}'
+        )
+        message = {"sender": "scammer", "text": "See you at dinner"}
+        asyncio.run(orchestrator.process_message("s1", message, [], {}))
+        
+        assert orchestrator.actor.model.calls == 0
+    
+    def test_non_scam_turn_takes_fast_path(self, orchestrator):
+        """Test a negative verdict skips intelligence and repeats hit the cache."""
+        orchestrator.detector.model = FakeModel(
+            '{"is_scam": false, "confidence": 0.9, "reason": "Refund notice", "indicators": []}'
+        )
+        message = {"sender": "scammer", "text": "Your refund went to shop@ybl"}
+        first = asyncio.run(orchestrator.process_message("s1", message, [], {}))
+        second = asyncio.run(orchestrator.process_message("s2", message, [], {}))
+        
+        assert first["extractedIntelligence"]["upiIds"] == []
+        assert second["engagementMetrics"]["conversationTurn"] == 1
+        assert second["agentNotes"] == "Detection: Refund notice"
+        assert orchestrator.detector.model.calls == 1
+        assert not orchestrator.session_manager.get_or_create_session("s1")["intelligence"]["upiIds"]
+    
+    def test_unsure_non_scam_verdict_keeps_full_path(self, orchestrator):
+        """Test a negative verdict below the threshold still records intelligence."""
+        orchestrator.detector.model = FakeModel(
+            '{"is_scam": false, "confidence": 0.1, "reason": "Unclear", "indicators": []}'
+        )
+        message = {"sender": "scammer", "text": "Your refund went to shop@ybl"}
+        result = asyncio.run(orchestrator.process_message("s1", message, [], {}))
+        
+        assert result["scamDetected"] is False
+        assert result["agentResponse"] == ""
+        assert result["extractedIntelligence"]["upiIds"] == ["shop@ybl"]
+        assert orchestrator.actor.model.calls == 0
+    
+    def test_run_batch_returns_results_in_order(self, orchestrator):
+        """Test batch processing keeps input order with a small in-flight limit."""
+        orchestrator.max_concurrent_llm = 2
+        messages = [
+            {"session_id": session_id, "message": {"sender": "scammer", "text": "Pay to fraud@ybl"}}
+            for session_id in ("a", "b", "a", "b", "a")
+        ]
+        results = asyncio.run(orchestrator.run_batch(messages))
+        
+        turns = [r["engagementMetrics"]["conversationTurn"] for r in results]
+        assert turns == [1, 1, 2, 2, 3]
+    
+    def test_process_message_sync(self, orchestrator):
+        """Test the blocking wrapper for callers without an event loop."""
+        message = {"sender": "scammer", "text": "Pay to fraud@ybl today"}
+        result = orchestrator.process_message_sync("s1", message, [], {})
+        
+        assert result["status"] == "success"
 
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
+
+
+class TestRateLimiter:
+    """Test Gemini rate limiting and retry helpers."""
+    
+    def test_backoff_delay_grows_with_jitter(self):
+        """Test backoff doubles per attempt within jitter bounds and is capped."""
+        for attempt in range(4):
+            delay = backoff_delay(attempt, base=0.25)
+            assert 0.125 * 2 ** attempt <= delay <= 0.375 * 2 ** attempt
+        assert backoff_delay(20, base=0.25, cap=30) <= 45
+    
+    def test_is_retryable(self):
+        """Test only transient API errors are retried."""
+        assert is_retryable(google_exceptions.ResourceExhausted("quota")) is True
+        assert is_retryable(google_exceptions.DeadlineExceeded("slow")) is True
+        assert is_retryable(google_exceptions.InvalidArgument("bad")) is False
+        assert is_retryable(ValueError("unparseable")) is True
+    
+    def test_limiter_allows_burst_then_waits(self):
+        """Test requests beyond the bucket capacity wait for refill."""
+        limiter = GeminiLimiter(rpm=600)
+        limiter.requests.tokens = 1
+        
+        async def acquire_twice():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            await limiter.acquire()
+            first = loop.time() - start
+            await limiter.acquire()
+            return first, loop.time() - start
+        
+        first, total = asyncio.run(acquire_twice())
+        
+        assert first < 0.05
+        assert total >= 0.09
+    
+    def test_limiter_enforces_token_budget(self):
+        """Test the token dimension blocks requests that exceed the budget."""
+        limiter = GeminiLimiter(rpm=0, tpm=60000)
+        limiter.tokens.tokens = 0
+        
+        assert limiter.requests is None
+        assert limiter.tokens.wait_time(1000) > 0
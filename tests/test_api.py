@@ -6,22 +6,8 @@ Note: Requires GEMINI_API_KEY to be set for full functionality tests.
 """
 
 import pytest
-import sys
 import os
 
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from fastapi.testclient import TestClient
-
-# Set test API key before importing app
-os.environ["API_SECRET_KEY"] = "test-api-key"
-os.environ["GUVI_CALLBACK_ENABLED"] = "false"
-
-from api.main import app
-
-client = TestClient(app)
-
 # Test headers
 VALID_HEADERS = {"x-api-key": "test-api-key"}
 INVALID_HEADERS = {"x-api-key": "wrong-key"}
@@ -30,7 +16,7 @@ INVALID_HEADERS = {"x-api-key": "wrong-key"}
 class TestHealthEndpoint:
     """Test health check endpoint."""
     
-    def test_health_check_returns_ok(self):
+    def test_health_check_returns_ok(self, client):
         """Test health endpoint returns 200."""
         response = client.get("/health")
         assert response.status_code == 200
@@ -40,17 +26,32 @@ class TestHealthEndpoint:
         assert "timestamp" in data
         assert "version" in data
     
-    def test_root_endpoint(self):
+    def test_root_endpoint(self, client):
         """Test root endpoint."""
         response = client.get("/")
         assert response.status_code == 200
         assert response.json()["status"] == "ok"
 
 
+class TestStaticPages:
+    """Test the cached HTML pages."""
+    
+    def test_page_revalidates_with_etag(self, client):
+        """Test a repeat request with the page's ETag gets 304."""
+        first = client.get("/tester")
+        assert first.status_code == 200
+        assert first.headers["content-type"].startswith("text/html")
+        etag = first.headers["etag"]
+        
+        repeat = client.get("/tester", headers={"If-None-Match": etag})
+        assert repeat.status_code == 304
+        assert repeat.content == b""
+
+
 class TestAuthentication:
     """Test API key authentication."""
     
-    def test_missing_api_key_returns_error(self):
+    def test_missing_api_key_returns_error(self, client):
         """Test that missing API key returns 422 (missing required header)."""
         response = client.post(
             "/analyze",
@@ -64,7 +65,7 @@ class TestAuthentication:
         # FastAPI returns 422 for missing required headers
         assert response.status_code == 422
     
-    def test_invalid_api_key_returns_401(self):
+    def test_invalid_api_key_returns_401(self, client):
         """Test that invalid API key returns 401."""
         response = client.post(
             "/analyze",
@@ -83,7 +84,7 @@ class TestAuthentication:
 class TestAnalyzeEndpoint:
     """Test /analyze endpoint functionality."""
     
-    def test_analyze_valid_request_structure(self):
+    def test_analyze_valid_request_structure(self, client):
         """Test that analyze accepts valid request structure."""
         # Note: This may return 503 if GEMINI_API_KEY is not set
         response = client.post(
@@ -108,7 +109,7 @@ class TestAnalyzeEndpoint:
         # Accept either success or 503 (no API key)
         assert response.status_code in [200, 503]
     
-    def test_analyze_invalid_request_missing_fields(self):
+    def test_analyze_invalid_request_missing_fields(self, client):
         """Test that analyze rejects invalid requests."""
         response = client.post(
             "/analyze",
@@ -123,12 +124,12 @@ class TestAnalyzeEndpoint:
 class TestSessionEndpoints:
     """Test session management endpoints."""
     
-    def test_get_session_requires_auth(self):
+    def test_get_session_requires_auth(self, client):
         """Test that session endpoint requires authentication."""
         response = client.get("/session/test-123")
         assert response.status_code == 422  # Missing header
     
-    def test_get_nonexistent_session(self):
+    def test_get_nonexistent_session(self, client):
         """Test getting a non-existent session."""
         response = client.get(
             "/session/nonexistent-session",
@@ -137,7 +138,7 @@ class TestSessionEndpoints:
         # May return 404 or 503 depending on orchestrator state
         assert response.status_code in [404, 503]
     
-    def test_delete_session_requires_auth(self):
+    def test_delete_session_requires_auth(self, client):
         """Test that delete session requires authentication."""
         response = client.delete("/session/test-123")
         assert response.status_code == 422
@@ -146,7 +147,7 @@ class TestSessionEndpoints:
 class TestRequestValidation:
     """Test request validation."""
     
-    def test_malformed_json_returns_error(self):
+    def test_malformed_json_returns_error(self, client):
         """Test malformed JSON handling."""
         response = client.post(
             "/analyze",
@@ -155,7 +156,7 @@ class TestRequestValidation:
         )
         assert response.status_code == 422
     
-    def test_message_with_empty_text(self):
+    def test_message_with_empty_text(self, client):
         """Test handling of empty message text."""
         response = client.post(
             "/analyze",
@@ -175,6 +176,47 @@ class TestRequestValidation:
         assert response.status_code in [200, 503]
 
 
+class TestConcurrentRequests:
+    """Test independent requests handled concurrently on one event loop."""
+    
+    def test_concurrent_auth_and_validation_errors(self):
+        """Test rejected requests keep their own status when interleaved."""
+        import asyncio
+        import httpx
+        from api.main import app
+        
+        analyze_body = {
+            "sessionId": "test-123",
+            "message": {"sender": "scammer", "text": "test", "timestamp": ""},
+            "conversationHistory": [],
+            "metadata": {}
+        }
+        
+        async def run():
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as ac:
+                return await asyncio.gather(
+                    ac.post("/analyze", json=analyze_body, headers=INVALID_HEADERS),
+                    ac.post("/analyze", json=analyze_body),
+                    ac.post(
+                        "/analyze",
+                        headers={**VALID_HEADERS, "Content-Type": "application/json"},
+                        content="not valid json"
+                    ),
+                    ac.get("/session/test-123"),
+                    ac.delete("/session/test-123"),
+                )
+        
+        invalid_key, missing_key, malformed, get_session, delete_session = asyncio.run(run())
+        
+        assert invalid_key.status_code == 401
+        assert "Invalid API key" in invalid_key.json()["error"]
+        assert missing_key.status_code == 422
+        assert malformed.status_code == 422
+        assert get_session.status_code == 422
+        assert delete_session.status_code == 422
+
+
 class TestResponseFormat:
     """Test response format compliance."""
     
@@ -182,7 +224,7 @@ class TestResponseFormat:
         not os.environ.get("GEMINI_API_KEY"),
         reason="Requires GEMINI_API_KEY"
     )
-    def test_analyze_response_format(self):
+    def test_analyze_response_format(self, client):
         """Test that analyze returns correct format."""
         response = client.post(
             "/analyze",
@@ -228,7 +270,7 @@ class TestResponseFormat:
 class TestCORS:
     """Test CORS configuration."""
     
-    def test_cors_headers_present(self):
+    def test_cors_headers_present(self, client):
         """Test that CORS headers are present."""
         response = client.options(
             "/analyze",
@@ -241,5 +283,226 @@ class TestCORS:
         assert response.status_code in [200, 405]
 
 
+class TestAuth:
+    """Test API key validation helpers."""
+    
+    def test_optional_api_key_and_reload(self, monkeypatch):
+        """Test keys are compared to the cached secret until it is reloaded."""
+        import asyncio
+        from api import auth
+        
+        assert asyncio.run(auth.optional_api_key("test-api-key")) == "test-api-key"
+        assert asyncio.run(auth.optional_api_key("wrong-key")) is None
+        
+        monkeypatch.setattr(auth.config, "API_SECRET_KEY", "rotated-key")
+        auth.reload_secret()
+        try:
+            assert asyncio.run(auth.optional_api_key("rotated-key")) == "rotated-key"
+            assert asyncio.run(auth.optional_api_key("test-api-key")) is None
+        finally:
+            monkeypatch.undo()
+            auth.reload_secret()
+
+
+class TestIncomingMessage:
+    """Test normalization of the flexible /analyze request model."""
+    
+    def test_normalized_message_formats(self):
+        """Test text, content and plain-text inputs normalize the same way."""
+        from api.models import IncomingMessage
+        
+        standard = IncomingMessage(message={"sender": "scammer", "text": "Pay now", "timestamp": "t1"})
+        assert standard.get_normalized_message() == {"sender": "scammer", "text": "Pay now", "timestamp": "t1"}
+        
+        content = IncomingMessage(message={"sender": "scammer", "content": "Pay now"}).get_normalized_message()
+        assert content["text"] == "Pay now"
+        assert content["timestamp"]
+        
+        plain = IncomingMessage(text="Pay now").get_normalized_message()
+        assert plain["sender"] == "unknown"
+        assert plain["text"] == "Pay now"
+
+
+class TestReplyCache:
+    """Test that retried /analyze turns reuse the generated reply."""
+    
+    def test_retried_turn_served_from_cache(self, client, monkeypatch):
+        """Test a repeated turn does not reach the orchestrator again."""
+        from api import main
+        
+        calls = []
+        
+        class FakeOrchestrator:
+            async def process_message(self, session_id, message, history=None, metadata=None):
+                calls.append(session_id)
+                return {"agentResponse": f"reply {len(calls)}", "continueConversation": True}
+        
+        monkeypatch.setattr(main, "orchestrator", FakeOrchestrator())
+        main._reply_cache.clear()
+        payload = {
+            "sessionId": "reply-cache-session",
+            "message": {"sender": "scammer", "text": "Send your OTP now", "timestamp": "2024-01-01T00:00:00"},
+            "conversationHistory": [],
+        }
+        
+        try:
+            first = client.post("/analyze", json=payload, headers=VALID_HEADERS)
+            second = client.post("/analyze", json=payload, headers=VALID_HEADERS)
+            payload["message"]["text"] = "Why are you not replying?"
+            third = client.post("/analyze", json=payload, headers=VALID_HEADERS)
+        finally:
+            main._reply_cache.clear()
+        
+        assert first.json() == second.json() == {"status": "success", "reply": "reply 1"}
+        assert third.json()["reply"] == "reply 2"
+        assert len(calls) == 2
+
+
+class TestSessionReaper:
+    """Test the background cleanup of old sessions."""
+    
+    def test_reaper_sweeps_sessions_until_cancelled(self, monkeypatch):
+        """Test the reaper calls cleanup_old_sessions on each interval."""
+        import asyncio
+        from api import main
+        
+        sweeps = []
+        
+        class FakeSessionManager:
+            def cleanup_old_sessions(self, max_age_hours=24):
+                sweeps.append(max_age_hours)
+                return 0
+        
+        class FakeOrchestrator:
+            session_manager = FakeSessionManager()
+        
+        monkeypatch.setattr(main, "orchestrator", FakeOrchestrator())
+        
+        async def run():
+            reaper = asyncio.create_task(main._reap_sessions(0, 6))
+            while len(sweeps) < 2:
+                await asyncio.sleep(0)
+            reaper.cancel()
+            try:
+                await reaper
+            except asyncio.CancelledError:
+                pass
+            return reaper.cancelled()
+        
+        assert asyncio.run(run())
+        assert sweeps[:2] == [6, 6]
+
+
+class TestCallbackHandler:
+    """Test the GUVI callback HTTP client lifecycle."""
+    
+    def test_client_is_reused_within_a_loop(self):
+        """Test callbacks share one pooled client per event loop."""
+        import asyncio
+        from api.callback import CallbackHandler
+        
+        handler = CallbackHandler(callback_url="http://localhost/callback", enabled=True)
+        
+        async def get_twice():
+            first = handler._get_client()
+            second = handler._get_client()
+            await handler.aclose()
+            return first, second
+        
+        first, second = asyncio.run(get_twice())
+        
+        assert first is second
+        assert first.is_closed
+    
+    def test_build_payload_agent_notes(self):
+        """Test agent notes for complete, partial and empty summaries."""
+        from api.callback import CallbackHandler
+        
+        handler = CallbackHandler(callback_url="http://localhost/callback", enabled=True)
+        full = {"personaUsed": "elderly", "endReason": "max_turns_reached", "highValueIntelCount": 2}
+        
+        assert handler._build_payload("s1", full)["agentNotes"] == (
+            "Persona: elderly. End reason: max_turns_reached. Extracted 2 high-value items"
+        )
+        assert handler._build_payload("s1", {"personaUsed": "elderly"})["agentNotes"] == "Persona: elderly"
+        assert handler._build_payload("s1", {})["agentNotes"] == "Conversation completed."
+    
+    def test_callback_client_error_fails_fast(self):
+        """Test a rejected callback (4xx) is not retried."""
+        import asyncio
+        import httpx
+        from api.callback import CallbackHandler
+        
+        handler = CallbackHandler(callback_url="http://localhost/callback", max_retries=3, enabled=True)
+        requests = []
+        
+        def respond(request):
+            requests.append(request)
+            return httpx.Response(404)
+        
+        async def send():
+            handler._client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+            handler._client_loop = asyncio.get_running_loop()
+            ok = await handler.send_final_callback("s1", {})
+            await handler.aclose()
+            return ok
+        
+        assert asyncio.run(send()) is False
+        assert len(requests) == 1
+    
+    def test_callback_posts_serialized_payload(self):
+        """Test the callback body is the JSON payload with a JSON content type."""
+        import asyncio
+        import json
+        import httpx
+        from api.callback import CallbackHandler
+        
+        handler = CallbackHandler(callback_url="http://localhost/callback", enabled=True)
+        requests = []
+        
+        def respond(request):
+            requests.append(request)
+            return httpx.Response(200)
+        
+        async def send():
+            handler._client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+            handler._client_loop = asyncio.get_running_loop()
+            ok = await handler.send_final_callback("s1", {"scamDetected": True})
+            await handler.aclose()
+            return ok
+        
+        assert asyncio.run(send()) is True
+        assert requests[0].headers["content-type"] == "application/json"
+        assert json.loads(requests[0].content)["sessionId"] == "s1"
+    
+    def test_concurrent_callbacks_for_session_post_once(self):
+        """Test a session ended twice at once is only sent to GUVI once."""
+        import asyncio
+        import httpx
+        from api.callback import CallbackHandler
+        
+        handler = CallbackHandler(callback_url="http://localhost/callback", enabled=True)
+        requests = []
+        
+        async def respond(request):
+            requests.append(request)
+            await asyncio.sleep(0.01)
+            return httpx.Response(200)
+        
+        async def send_twice():
+            handler._client = httpx.AsyncClient(transport=httpx.MockTransport(respond))
+            handler._client_loop = asyncio.get_running_loop()
+            results = await asyncio.gather(
+                handler.send_final_callback("s1", {"scamDetected": True}),
+                handler.send_final_callback("s1", {"scamDetected": True}),
+            )
+            await handler.aclose()
+            return results
+        
+        assert asyncio.run(send_twice()) == [True, True]
+        assert len(requests) == 1
+        assert handler._inflight == {}
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -10,11 +10,6 @@ Tests the IntelligenceExtractor class for:
 """
 
 import pytest
-import sys
-import os
-
-# Add parent directory to path
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from intelligence.extractors import IntelligenceExtractor
 from intelligence.validators import (
@@ -36,19 +31,19 @@ class TestValidators:
         assert is_valid_bank_account("503041234567") is True  # Realistic SBI format
         assert is_valid_bank_account("918020043210123") is True  # Realistic HDFC format
     
-    def test_invalid_bank_account_too_short(self):
-        """Test bank accounts that are too short."""
-        assert is_valid_bank_account("12345678") is False
-        assert is_valid_bank_account("1234") is False
-    
-    def test_invalid_bank_account_all_same(self):
-        """Test bank accounts with all same digits."""
-        assert is_valid_bank_account("111111111") is False
-        assert is_valid_bank_account("999999999999") is False
-    
-    def test_invalid_bank_account_sequential(self):
-        """Test sequential bank account patterns."""
-        assert is_valid_bank_account("123456789") is False
+    @pytest.mark.parametrize("number", [
+        # Too short
+        "12345678",
+        "1234",
+        # All same digits
+        "111111111",
+        "999999999999",
+        # Sequential
+        "123456789",
+    ])
+    def test_invalid_bank_account(self, number):
+        """Test bank accounts that are too short, repeated or sequential."""
+        assert is_valid_bank_account(number) is False
     
     def test_valid_upi_id(self):
         """Test valid UPI IDs."""
@@ -67,6 +62,17 @@ class TestValidators:
         assert is_valid_upi_id("noatsymbol") is False
         assert is_valid_upi_id("@paytm") is False
         assert is_valid_upi_id("ab@paytm") is False  # Too short username
+        assert is_valid_upi_id("user@name@paytm") is False
+        assert is_valid_upi_id("user\n@paytm") is False
+        assert is_valid_upi_id("User.Name@PayTM") is True
+    
+    def test_url_validation_is_cached(self):
+        """Test a repeated URL candidate is answered from the cache."""
+        is_valid_url.cache_clear()
+        assert is_valid_url("bit.ly/claim-prize") is True
+        assert is_valid_url("bit.ly/claim-prize") is True
+        info = is_valid_url.cache_info()
+        assert (info.hits, info.misses) == (1, 1)
     
     def test_valid_phone_number(self):
         """Test valid Indian phone numbers."""
@@ -92,6 +98,11 @@ class TestValidators:
         assert extract_clean_phone("+91 9876543210") == "+919876543210"
         assert extract_clean_phone("91-9876-543210") == "+919876543210"
         assert extract_clean_phone("09876543210") == "+919876543210"
+        # A 10-digit number starting with 91 is not a country code
+        assert extract_clean_phone("9198765432") == "+919198765432"
+        assert extract_clean_phone("5876543210") is None
+        assert extract_clean_phone("+91+9876543210") is None
+        assert extract_clean_phone("0919876543210") is None
 
 
 class TestIntelligenceExtractor:
@@ -121,6 +132,29 @@ class TestIntelligenceExtractor:
         assert "scammer@paytm" in result
         assert "fraud@ybl" in result
     
+    def test_extract_upi_ids_uses_validator_providers(self, extractor):
+        """Test every provider known to the validator is extracted, and others are not."""
+        text = "Send to refund.desk@cnrb or Help@Finobank, not joe@gmail.com"
+        result = extractor.extract_upi_ids(text)
+        assert result == ["refund.desk@cnrb", "help@finobank"]
+    
+    def test_extraction_caps_items_per_type(self, extractor):
+        """Test a flood of distinct numbers is capped per type."""
+        text = " ".join(f"98765{i:05d}" for i in range(100))
+        result = extractor.extract_phone_numbers(text)
+        assert len(result) == extractor.MAX_ITEMS_PER_TYPE
+        assert result[0] == "+919876500000"
+    
+    def test_extract_upi_ids_adversarial_input_is_fast(self, extractor):
+        """Test a long word/dot run without a provider does not backtrack quadratically."""
+        import time
+        
+        text = "a.b-" * 5000 + "@x and pay scammer@paytm"
+        start = time.perf_counter()
+        result = extractor.extract_upi_ids(text)
+        assert time.perf_counter() - start < 0.5
+        assert result == ["scammer@paytm"]
+    
     def test_extract_phone_numbers(self, extractor):
         """Test phone number extraction."""
         text = "Call us at +91 9876543210 or 8765432109 for help."
@@ -134,6 +168,11 @@ class TestIntelligenceExtractor:
         result = extractor.extract_urls(text)
         assert "http://fake-bank.com" in result
     
+    def test_extract_all_finds_bare_www_links(self, extractor):
+        """Links without a '/' are still found by extract_all."""
+        result = extractor.extract_all("Visit WWW.fake-bank.com now.")
+        assert result["phishingLinks"] == ["WWW.fake-bank.com"]
+    
     def test_extract_keywords(self, extractor):
         """Test keyword extraction."""
         text = "URGENT: Account suspended! Verify immediately or face legal action."
@@ -169,6 +208,38 @@ class TestIntelligenceExtractor:
         assert result["phishingLinks"] == []
         assert result["suspiciousKeywords"] == []
     
+    def test_extract_all_prefilters_match_full_scan(self, extractor):
+        """Test skipped patterns give the same result as running them."""
+        texts = [
+            "Your account is blocked, act now",
+            "Pay fraud@ybl via https://bit.ly/x or call 9876543210",
+            "Visit http://[::1]/login",
+        ]
+        for text in texts:
+            result = extractor.extract_all(text)
+            assert result["bankAccounts"] == extractor.extract_bank_accounts(text)
+            assert result["upiIds"] == extractor.extract_upi_ids(text)
+            assert result["phoneNumbers"] == extractor.extract_phone_numbers(text)
+            assert result["phishingLinks"] == extractor.extract_urls(text)
+    
+    def test_extract_all_caches_repeated_text(self, extractor, monkeypatch):
+        """Test a repeated text is extracted once and callers get fresh lists."""
+        calls = []
+        original = extractor._extract_uncached
+        monkeypatch.setattr(extractor, "_extract_uncached", lambda text: calls.append(text) or original(text))
+        
+        text = "Pay fraud@ybl now"
+        first = extractor.extract_all(text)
+        first["upiIds"].append("tampered@ybl")
+        second = extractor.extract_all(text)
+        
+        assert calls == [text]
+        assert second["upiIds"] == ["fraud@ybl"]
+        
+        extractor.clear_cache()
+        extractor.extract_all(text)
+        assert calls == [text, text]
+    
     def test_no_duplicates(self, extractor):
         """Test that duplicates are removed."""
         text = "Call 9876543210 or +919876543210 or 9876543210"